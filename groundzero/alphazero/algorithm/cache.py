@@ -0,0 +1,217 @@
+import hashlib
+import threading
+import numpy as np
+import chess
+import chess.polyglot
+from collections import OrderedDict
+from .encoder import AlphaZeroEncoder
+
+_MASK64 = (1 << 64) - 1
+_encoder = AlphaZeroEncoder(history_len=2) # Same history as the evaluator's encoder
+
+# Rough footprint of one cached entry: the priors dict, its Move keys and
+# float values (~140 B per legal move) plus the key, tuple and LRU links.
+_ENTRY_BYTES = 256
+_BYTES_PER_MOVE = 140
+
+def position_key(board: chess.Board):
+    """
+    64-bit key for a network evaluation: Zobrist hash of the position
+    (pieces, side to move, castling, en passant) mixed with the halfmove
+    clock and the earlier positions in the history planes, which the
+    encoder also feeds to the network. Transpositions reached through a
+    different last move get different keys.
+    """
+    key = chess.polyglot.zobrist_hash(board)
+    key ^= (board.halfmove_clock * 0x9E3779B97F4A7C15) & _MASK64
+    history = tuple(_encoder._history_masks(board)[12:]) # The current position's 12 are in the Zobrist hash
+    return key ^ ((hash(history) * 0xBF58476D1CE4E5B9) & _MASK64)
+
+class EvalCache:
+    """
+    Bounded LRU cache of (priors, value) evaluations keyed by position_key().
+    Entries survive across searches and games; the cache is only dropped when
+    the model version it was filled with changes.
+    """
+    def __init__(self, max_mb=256):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.version = None
+        self._entries = OrderedDict() # key -> (priors, value, size)
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, priors, value, version=None):
+        """Stores an evaluation; one made by a model `version` other than the cache's is dropped."""
+        size = _ENTRY_BYTES + _BYTES_PER_MOVE * len(priors)
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes_used -= old[2]
+            self._entries[key] = (priors, value, size)
+            self.bytes_used += size
+            while self.bytes_used > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes_used -= evicted
+                self.evictions += 1
+
+    def set_version(self, version):
+        """Binds the cache to a model version, dropping entries from any other."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries = OrderedDict()
+        self.bytes_used = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "mb_used": round(self.bytes_used / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+def planes_key(*rows):
+    """128-bit hash of one position's encoded inputs (planes, legal move indices, ...)."""
+    h = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        h.update(np.ascontiguousarray(row))
+    return h.digest()
+
+class ResultCache:
+    """
+    The inference server's side of caching: network outputs keyed by the
+    hash of the encoded planes and legal moves, so it is shared by every
+    actor talking to the server. run() coalesces identical positions within a batch into one
+    slot and answers repeats from a bounded LRU, which is bound to a model
+    version like EvalCache. Dedup and hit rates are counted per version.
+    """
+    def __init__(self, max_mb=256, history=8):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.version = None
+        self._entries = OrderedDict() # key -> (priors, value)
+        self.bytes_used = 0
+        self.evictions = 0
+        self._history = history
+        self._counts = OrderedDict() # version -> [positions, coalesced, hits, evaluated]
+
+    def run(self, inputs, run_batch):
+        """
+        Drop-in for run_batch(*inputs), inputs being per-position arrays
+        (planes, legal moves, ...): (priors, values, version) for every row,
+        with each distinct uncached position evaluated once.
+        """
+        keys = [planes_key(*rows) for rows in zip(*inputs)]
+        n = len(inputs[0])
+        first = {} # key -> first row holding it
+        for i, key in enumerate(keys):
+            first.setdefault(key, i)
+        hits = {key: self._entries[key] for key in first if key in self._entries}
+        todo = [i for key, i in first.items() if key not in hits]
+
+        if len(todo) == n:
+            # Nothing to share: run the batch as is, without copying it
+            priors, values, version = run_batch(*inputs)
+            self.set_version(version)
+            self._count(n, 0, 0, len(todo))
+            for i, key in enumerate(keys):
+                self._put(key, priors[i], values[i])
+            return priors, values, version
+
+        results = {}
+        if todo:
+            priors, values, version = run_batch(*(a[todo] for a in inputs))
+            if version != self.version:
+                # The server swapped in new weights: what came from the cache is stale too
+                self.set_version(version)
+                stale = [first[key] for key in hits]
+                if stale:
+                    more_priors, more_values, _ = run_batch(*(a[stale] for a in inputs))
+                    priors, values = np.concatenate([priors, more_priors]), np.concatenate([values, more_values])
+                    todo += stale
+                hits = {}
+            for j, i in enumerate(todo):
+                results[keys[i]] = self._put(keys[i], priors[j], values[j])
+        results.update(hits)
+        self._count(n, n - len(first), len(hits), len(todo))
+
+        row = next(iter(results.values()))[0]
+        out_priors = np.empty((n,) + row.shape, dtype=row.dtype)
+        out_values = np.empty(n, dtype=np.float32)
+        for i, key in enumerate(keys):
+            out_priors[i], out_values[i] = results[key]
+        return out_priors, out_values, self.version
+
+    def _put(self, key, priors, value):
+        # Copy the row so the entry doesn't keep the whole batch's output alive
+        entry = (priors.copy(), float(value))
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes_used -= old[0].nbytes + _ENTRY_BYTES
+        self._entries[key] = entry
+        self.bytes_used += entry[0].nbytes + _ENTRY_BYTES
+        while self.bytes_used > self.max_bytes and len(self._entries) > 1:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.bytes_used -= evicted.nbytes + _ENTRY_BYTES
+            self.evictions += 1
+        return entry
+
+    def set_version(self, version):
+        """Binds the cache to a model version, dropping entries from any other."""
+        if version == self.version:
+            return
+        self.version = version
+        self._entries = OrderedDict()
+        self.bytes_used = 0
+
+    def _count(self, positions, coalesced, hits, evaluated):
+        counts = self._counts.setdefault(self.version, [0, 0, 0, 0])
+        for j, n in enumerate((positions, coalesced, hits, evaluated)):
+            counts[j] += n
+        while len(self._counts) > self._history:
+            self._counts.popitem(last=False)
+
+    def stats(self):
+        per_version = {}
+        for version, (positions, coalesced, hits, evaluated) in self._counts.items():
+            distinct = positions - coalesced
+            per_version[str(version)] = {
+                "positions": positions,
+                "evaluated": evaluated,
+                "dedup_rate": round(coalesced / positions, 3) if positions else 0.0,
+                "hit_rate": round(hits / distinct, 3) if distinct else 0.0,
+            }
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "mb_used": round(self.bytes_used / (1024 * 1024), 2),
+            "evictions": self.evictions,
+            "per_version": per_version,
+        }
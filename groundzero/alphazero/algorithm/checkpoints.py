@@ -0,0 +1,26 @@
+import os
+import torch
+
+# Checkpoints are {"version": int, "state_dict": ...}, written to a temp file
+# and renamed over the old one so a reader never sees a partial checkpoint.
+# Plain state_dict files from before versioning load as version 0.
+
+def save_checkpoint(state_dict, path, version):
+    tmp = path + ".tmp"
+    torch.save({"version": int(version), "state_dict": state_dict}, tmp)
+    os.replace(tmp, path)
+
+def load_checkpoint(path, map_location="cpu"):
+    """(state_dict, version) of a checkpoint, versioned or not."""
+    data = torch.load(path, map_location=map_location)
+    if isinstance(data, dict) and "state_dict" in data and "version" in data:
+        return data["state_dict"], int(data["version"])
+    return data, 0
+
+def file_stamp(path):
+    """Cheap change check for watchers: (mtime_ns, size), or None if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
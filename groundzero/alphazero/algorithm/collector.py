@@ -1,11 +1,13 @@
 import numpy as np
 import chess
-import torch
 import os
 import time
+import asyncio
 from collections import Counter, deque
 from algorithm.evaluator import AlphaZeroEvaluator
+from algorithm.replay import save_samples, sparse_policy
 from mcts.search import MCTS
+from mcts.profiling import SearchProfile
 
 class DataCollector:
     def __init__(self, model_path=None, device="cpu"):
@@ -26,21 +28,69 @@ class DataCollector:
         self.hall_of_fame = [] 
         self.all_time_phase = {"opening": 0.0, "midgame": 0.0, "endgame": 0.0}
         self.recent_phase_window = deque(maxlen=20) 
+        self.start_time = time.time()
+        self.last_game_profile = None # Search profiles summed over the last finished game
 
     def update_model(self, path):
-        if os.path.exists(path):
-            try:
-                self.evaluator.model.load_state_dict(torch.load(path, map_location=self.evaluator.device))
-                self.evaluator.model.eval()
-            except: pass 
+        # No-op unless the checkpoint changed; a new version also invalidates the eval cache.
+        # In batch mode the inference server swaps weights itself.
+        if self.evaluator.batch_mode:
+            return
+        try:
+            self.evaluator.load_model(path)
+        except: pass 
+
+    def throughput(self):
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return {
+            "games_per_hour": round(self.total_games * 3600 / elapsed, 1),
+            "positions_per_sec": round(self.total_samples / elapsed, 2),
+        }
 
     def collect_game(self, worker_id=None, stats=None):
+        return asyncio.run(self._play_game(self.engine, worker_id, stats))
+
+    def collect_games(self, num_games, worker_id=None, stats=None, on_game=None, max_games=None, inflight_per_game=8):
+        """
+        Plays `num_games` games at once in this process. Every game has its own
+        search tree but they share one event loop, so the evaluator batches the
+        pending leaves of all games into a single network call. Each finished
+        game is handed to on_game(game_data) and its slot starts a new one;
+        returns after max_games games (None = run forever).
+        """
+        return asyncio.run(self._run_games(num_games, worker_id, stats, on_game, max_games, inflight_per_game))
+
+    async def _run_games(self, num_games, worker_id, stats, on_game, max_games, inflight_per_game):
+        started = [0]
+
+        async def play_slot(slot):
+            engine = MCTS(self.evaluator)
+            engine.params.update(self.engine.params)
+            engine.params['SEARCH_MODE'] = 'async'
+            engine.params['ASYNC_INFLIGHT'] = inflight_per_game
+            slot_id = f"{worker_id}.{slot}" if worker_id is not None else None
+
+            while max_games is None or started[0] < max_games:
+                started[0] += 1
+                game_data = await self._play_game(engine, slot_id, stats)
+                if on_game is not None:
+                    on_game(game_data)
+
+        await asyncio.gather(*(play_slot(i) for i in range(num_games)))
+
+    async def _search(self, engine, board, root):
+        if engine.params['SEARCH_MODE'] == 'async':
+            return await engine.search_async(board, is_training=True, root=root)
+        return engine.search(board, is_training=True, root=root)
+
+    async def _play_game(self, engine, worker_id=None, stats=None):
         board = chess.Board()
         game_data = []
         move_count = 0
         current_game_fens = [board.fen()]
         this_game_phase = {"opening": 0.0, "midgame": 0.0, "endgame": 0.0}
         value_history = []
+        game_profile = SearchProfile()
         root = None 
         
         # Linear decay of forced randomness
@@ -49,11 +99,12 @@ class DataCollector:
         temp_threshold = np.random.randint(15, 30)
 
         while not board.is_game_over() and move_count < 250:
-            self.evaluator.clear_cache()
-            
             start_search = time.time()
-            best_move, pi_dist, root = self.engine.search(board, is_training=True, root=root)
+            best_move, pi_dist, root = await self._search(engine, board, root)
             search_duration = time.time() - start_search
+            root_value = float(root.value)
+            if engine.latest_profile is not None:
+                game_profile.add(engine.latest_profile)
 
             # Selection Logic
             if is_forced_exploration and move_count < self.FORCE_RANDOM_PLIES:
@@ -67,10 +118,8 @@ class DataCollector:
                 else:
                     selected_move = max(pi_dist, key=pi_dist.get)
 
-                if root and selected_move in root.children:
-                    root = root.children[selected_move]
-                else:
-                    root = None 
+                # Reuse the chosen subtree (None if it was never expanded)
+                root = root.child(selected_move) if root is not None else None
 
             if move_count == 0:
                 self.opening_stats[board.san(selected_move)] += 1
@@ -82,7 +131,7 @@ class DataCollector:
             # --- VALUE HEAD FIX ---
             # Map Tanh (-1 to 1) to Probability (0 to 1). 
             # 0.0 becomes 0.5 (50%), 1.0 becomes 1.0 (100%), -1.0 becomes 0.0 (0%)
-            raw_val = float(self.evaluator.latest_value)
+            raw_val = root_value
             win_prob = (raw_val + 1) / 2 
             value_history.append(raw_val)
 
@@ -94,7 +143,8 @@ class DataCollector:
                 stats[worker_id] = {
                     "status": "Thinking" if not (is_forced_exploration and move_count < self.FORCE_RANDOM_PLIES) else "Exploring",
                     "move_count": move_count,
-                    "last_depth": int(self.engine.latest_depth),
+                    "last_depth": int(engine.latest_depth),
+                    "simulations": int(engine.latest_stats.get("simulations", 0)),
                     "value": round(win_prob, 3), # Sends 0.500 instead of 50.0
                     "entropy": float(-np.sum(np.array(list(pi_dist.values())) * np.log2(np.array(list(pi_dist.values())) + 1e-9))),
                     "inference_ms": float(self.evaluator.last_inference_time * 1000),
@@ -105,21 +155,26 @@ class DataCollector:
                     "total_samples": self.total_samples,
                     "openings": dict(self.opening_stats),
                     "turn": "White" if board.turn == chess.WHITE else "Black",
-                    "recent_gallery": list(self.hall_of_fame)
+                    "recent_gallery": list(self.hall_of_fame),
+                    "search_profile": game_profile.as_dict(),
+                    "model_version": self.evaluator.model_version,
+                    **self.throughput()
                 }
 
-            state = self.evaluator.encoder.encode(board)
-            pi_array = np.zeros(4096, dtype=np.float32)
-            for move, prob in pi_dist.items():
-                idx = (move.from_square * 64) + move.to_square
-                pi_array[idx] = prob
+            # Packed position (~200 B); the trainer expands it to planes per batch
+            bitboards, castling, halfmove = self.evaluator.encoder.pack_batch([board])
+            # Policy target as (move index, probability) pairs
+            pi_idx, pi_prob = sparse_policy(pi_dist)
             
-            game_data.append({"state": state, "pi": pi_array, "turn": board.turn})
+            game_data.append({"bitboards": bitboards[0], "castling": castling[0], "halfmove": halfmove[0],
+                              "pi_idx": pi_idx, "pi_prob": pi_prob, "turn": board.turn,
+                              "model_version": self.evaluator.model_version}) # Net behind this search
             board.push(selected_move)
             current_game_fens.append(board.fen())
             move_count += 1
 
         self.recent_phase_window.append(this_game_phase)
+        self.last_game_profile = game_profile
         res_str = board.result() if board.is_game_over() else "1/2-1/2"
         outcome = 1.0 if res_str == "1-0" else -1.0 if res_str == "0-1" else 0.0
         
@@ -138,13 +193,22 @@ class DataCollector:
 
         self.total_games += 1
         self.total_samples += len(game_data)
-        return [{"state": s["state"], "pi": s["pi"], "z": float(outcome if s["turn"] == chess.WHITE else -outcome)} for s in game_data]
+        return [{"bitboards": s["bitboards"], "castling": s["castling"], "halfmove": s["halfmove"],
+                 "pi_idx": s["pi_idx"], "pi_prob": s["pi_prob"], "model_version": s["model_version"],
+                 "z": float(outcome if s["turn"] == chess.WHITE else -outcome)} for s in game_data]
 
     def save_batch(self, game_data, filename):
         path = os.path.join(self.buffer_path, filename)
-        np.savez_compressed(
-            path, 
-            states=np.array([s["state"] for s in game_data], dtype=np.float32), 
-            pis=np.array([s["pi"] for s in game_data], dtype=np.float32), 
-            zs=np.array([s["z"] for s in game_data], dtype=np.float32)
-        )
\ No newline at end of file
+        tmp = path + ".tmp" # The trainer only globs *.npz, so it never sees a partial file
+        with open(tmp, "wb") as f:
+            save_samples(
+                f,
+                bitboards=np.array([s["bitboards"] for s in game_data]),
+                castling=np.array([s["castling"] for s in game_data]),
+                halfmove=np.array([s["halfmove"] for s in game_data]),
+                pi_idx=np.array([s["pi_idx"] for s in game_data]),
+                pi_prob=np.array([s["pi_prob"] for s in game_data]),
+                zs=np.array([s["z"] for s in game_data], dtype=np.float32),
+                model_versions=np.array([-1 if s["model_version"] is None else s["model_version"] for s in game_data])
+            )
+        os.replace(tmp, path)
\ No newline at end of file
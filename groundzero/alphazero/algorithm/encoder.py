@@ -1,56 +1,153 @@
 import numpy as np
 import chess
 
+MAX_LEGAL = 256 # Most legal moves in any chess position is 218
+_STATE_FIELDS = ("occupied_w", "occupied_b", "pawns", "knights", "bishops", "rooks", "queens", "kings")
+
 class AlphaZeroEncoder:
     def __init__(self, history_len=2):
         """
-        A balanced encoder. 
+        A balanced encoder.
         Current board (12) + 1 Past board (12) + 1 Meta (1) = 25 planes.
         """
         self.history_len = history_len
         self.num_planes = (12 * history_len) + 1
 
     def encode(self, board: chess.Board):
-        planes = np.zeros((self.num_planes, 8, 8), dtype=np.float32)
-        us = board.turn
-        them = not board.turn
+        return self.encode_batch([board])[0]
+
+    def encode_batch(self, boards, out=None):
+        """
+        Encodes boards into `out` (shape (len(boards), num_planes, 8, 8),
+        float32), allocating it if not given, and returns it.
+        """
+        return self.unpack_batch(*self.pack_batch(boards), out=out)
+
+    def legal_batch(self, boards, out=None, counts=None):
+        """
+        Legal moves of each board and their policy indices, (from << 6) | to.
+        Returns (moves, out, counts): the move lists, the indices zero-padded
+        into `out` ((N, MAX_LEGAL) int16) and the move counts ((N,) int16).
+        """
+        n = len(boards)
+        if out is None:
+            out = np.empty((n, MAX_LEGAL), dtype=np.int16)
+        if counts is None:
+            counts = np.empty(n, dtype=np.int16)
+        out[:] = 0 # Stale padding in reused buffers would defeat the server's dedup
+        moves = []
+        for i, board in enumerate(boards):
+            legal = list(board.legal_moves)
+            out[i, :len(legal)] = [(m.from_square << 6) | m.to_square for m in legal]
+            counts[i] = len(legal)
+            moves.append(legal)
+        return moves, out, counts
+
+    # --- Packed format ---
+    # A position is stored as the 12 * history_len piece bitboards already
+    # oriented for the side to move (bit i = square i = plane[rank, file] in
+    # row-major order), a castling byte (bit 0/1: our K/Q side, bit 2/3:
+    # theirs) and the halfmove clock: ~200 bytes instead of 6.4 KB of planes.
+
+    def pack_batch(self, boards):
+        """Returns (bitboards uint64 (N, 12*H), castling uint8 (N,), halfmove uint16 (N,))."""
+        n = len(boards)
+        masks = np.array([self._history_masks(board) for board in boards], dtype=np.uint64).reshape(n, 12 * self.history_len)
+        black = [board.turn == chess.BLACK for board in boards]
+        if any(black):
+            # Mirror for Black POV: byte-swapping a bitboard flips its ranks
+            masks = np.where(np.array(black)[:, None], masks.byteswap(), masks)
+
+        castling = np.array([self._castling_bits(board) for board in boards], dtype=np.uint8)
+        halfmove = np.array([board.halfmove_clock for board in boards], dtype=np.uint16)
+        return masks, castling, halfmove
+
+    def unpack_batch(self, bitboards, castling, halfmove, out=None):
+        """Expands packed positions to planes with one unpackbits for the whole batch."""
+        n = len(bitboards)
+        if out is None:
+            out = np.empty((n, self.num_planes, 8, 8), dtype=np.float32)
+        piece_planes = 12 * self.history_len
 
         # 1. Encode History
-        temp_board = board.copy()
-        for i in range(self.history_len):
-            if i > 0:
-                if len(temp_board.move_stack) > 0:
-                    temp_board.pop()
-                else:
-                    break # Pad with zeros if no more history
-            
-            offset = i * 12
-            self._encode_pieces(temp_board, planes, offset, us, them)
+        bits = np.unpackbits(np.ascontiguousarray(bitboards, dtype=np.uint64).view(np.uint8), axis=1, bitorder="little")
+        out[:, :piece_planes] = bits.reshape(n, piece_planes, 8, 8)
 
         # 2. Metadata Plane (The last plane)
-        meta_idx = self.num_planes - 1
-        
-        # Castling Rights (Our K/Q, then Theirs)
-        if board.has_kingside_castling_rights(us):  planes[meta_idx, 0, 7] = 1.0
-        if board.has_queenside_castling_rights(us): planes[meta_idx, 0, 0] = 1.0
-        if board.has_kingside_castling_rights(them): planes[meta_idx, 7, 7] = 1.0
-        if board.has_queenside_castling_rights(them): planes[meta_idx, 7, 0] = 1.0
-        
+        meta = out[:, piece_planes]
+        meta[:] = 0.0
+        meta[:, 0, 7] = castling & 1
+        meta[:, 0, 0] = (castling >> 1) & 1
+        meta[:, 7, 7] = (castling >> 2) & 1
+        meta[:, 7, 0] = (castling >> 3) & 1
         # Half-move clock (50-move rule progress)
-        planes[meta_idx, 4, 4] = board.halfmove_clock / 100.0
-
-        return planes
-
-    def _encode_pieces(self, board, planes, offset, us, them):
-        for piece_type in range(1, 7):
-            # Our pieces
-            self._fill_plane(board.pieces(piece_type, us), planes[offset + piece_type - 1], us)
-            # Their pieces
-            self._fill_plane(board.pieces(piece_type, them), planes[offset + piece_type + 5], us)
-
-    def _fill_plane(self, bitset, plane, perspective):
-        for square in bitset:
-            # Mirror for Black POV
-            render_sq = square if perspective == chess.WHITE else chess.square_mirror(square)
-            rank, file = divmod(render_sq, 8)
-            plane[rank, file] = 1.0
\ No newline at end of file
+        meta[:, 4, 4] = halfmove / 100.0
+        return out
+
+    def pack_planes(self, states):
+        """Packs already encoded planes (e.g. legacy replay files) into the packed format."""
+        states = np.asarray(states)
+        n = len(states)
+        piece_planes = 12 * self.history_len
+        bits = (states[:, :piece_planes] > 0.5).reshape(n, piece_planes * 64)
+        bitboards = np.packbits(bits, axis=1, bitorder="little").view(np.uint64)
+        meta = states[:, piece_planes]
+        castling = ((meta[:, 0, 7] > 0.5) | (meta[:, 0, 0] > 0.5) << 1
+                    | (meta[:, 7, 7] > 0.5) << 2 | (meta[:, 7, 0] > 0.5) << 3).astype(np.uint8)
+        halfmove = np.rint(meta[:, 4, 4].astype(np.float64) * 100).astype(np.uint16)
+        return bitboards, castling, halfmove
+
+    @staticmethod
+    def _castling_bits(board):
+        # Castling Rights (Our K/Q, then Theirs)
+        us = board.turn
+        them = not board.turn
+        return (board.has_kingside_castling_rights(us)
+                | board.has_queenside_castling_rights(us) << 1
+                | board.has_kingside_castling_rights(them) << 2
+                | board.has_queenside_castling_rights(them) << 3)
+
+    def _history_masks(self, board):
+        """
+        12 bitboards (our pieces P..K, then theirs) for the current position
+        and each earlier one, zeros once the move stack runs out. Earlier
+        positions are read from the board's saved states, so nothing is
+        copied or popped.
+        """
+        # The saved states are python-chess internals (Board._stack of
+        # _BoardState); if a release changes them, replay the moves instead
+        stack = getattr(board, "_stack", None)
+        if (stack is None or len(stack) != len(board.move_stack)
+                or (stack and not all(hasattr(stack[-1], f) for f in _STATE_FIELDS))):
+            return self._history_masks_popped(board)
+
+        us = board.turn
+        ours, theirs = board.occupied_co[us], board.occupied_co[not us]
+        types = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+        masks = [m & ours for m in types] + [m & theirs for m in types]
+
+        for i in range(1, self.history_len):
+            if i > len(stack):
+                masks += [0] * (12 * (self.history_len - i)) # Pad with zeros if no more history
+                break
+            s = stack[-i]
+            ours, theirs = (s.occupied_w, s.occupied_b) if us == chess.WHITE else (s.occupied_b, s.occupied_w)
+            types = (s.pawns, s.knights, s.bishops, s.rooks, s.queens, s.kings)
+            masks += [m & ours for m in types] + [m & theirs for m in types]
+        return masks
+
+    def _history_masks_popped(self, board):
+        # Public-API fallback for _history_masks: pop a short copy of the board
+        us = board.turn
+        b = board.copy(stack=self.history_len - 1)
+        masks = []
+        for i in range(self.history_len):
+            if i > 0:
+                if not b.move_stack:
+                    masks += [0] * (12 * (self.history_len - i))
+                    break
+                b.pop()
+            ours, theirs = b.occupied_co[us], b.occupied_co[not us]
+            types = (b.pawns, b.knights, b.bishops, b.rooks, b.queens, b.kings)
+            masks += [m & ours for m in types] + [m & theirs for m in types]
+        return masks
@@ -1,109 +1,192 @@
 import torch
 import chess
 import numpy as np
+import asyncio
 import time
-import uuid
-import os
-import threading
-from .model import AlphaNet
+from .model import AlphaNet, legal_softmax
 from .encoder import AlphaZeroEncoder
+from .cache import EvalCache, position_key
+from .export import load_inference_model
+from .checkpoints import file_stamp
 
 class AlphaZeroEvaluator:
-    def __init__(self, model_path=None, device="cpu"):
+    def __init__(self, model_path=None, device="cpu", cache_mb=256):
         self.device = device
         self.encoder = AlphaZeroEncoder(history_len=2) 
         
         self.batch_mode = False
-        self.task_queue = None
-        self.result_dict = None
+        self.transport = None # TransportClient of the inference server in batch mode
         
+        # Evaluations persist across moves and games; only a new model version drops them
+        self.cache = EvalCache(max_mb=cache_mb)
+        self.model_version = None # Checkpoint version of the latest evaluation
+        self._model_stamp = None
+
         self.model = AlphaNet(num_res_blocks=10, channels=128).to(self.device)
-        if model_path and os.path.exists(model_path):
-            self.model.load_state_dict(torch.load(model_path, map_location=device))
+        if model_path:
+            self.load_model(model_path)
         self.model.eval()
         
         self.last_inference_time = 0.0
         self.latest_value = 0.0
-        self._cache = {}
-        self._cache_lock = threading.Lock() # Protect cache for multi-threading
 
-    def set_batch_mode(self, task_queue, result_dict):
-        self.task_queue = task_queue
-        self.result_dict = result_dict
+        # Requests from evaluate_async waiting for the next batched flush
+        self._async_pending = {} # key -> (board, [futures])
+        self.async_batches = 0
+        self.async_evals = 0
+
+    def set_batch_mode(self, transport):
+        self.transport = transport
         self.batch_mode = True
 
+    def load_model(self, path):
+        """
+        Loads weights if the checkpoint file changed since the last load.
+        Returns True if new weights were loaded. `path` may also be a CPU
+        artifact from algorithm/export.py.
+        """
+        stamp = file_stamp(path)
+        if stamp is None or stamp == self._model_stamp:
+            return False
+        self.model, version = load_inference_model(path, self.device)
+        if isinstance(self.model, torch.jit.ScriptModule):
+            self.device = "cpu" # Exported artifacts only run on CPU
+        self._model_stamp = stamp
+        self.model_version = version
+        self.cache.set_version(version)
+        self.cache.clear() # Also for unversioned files, which all count as version 0
+        return True
+
     def clear_cache(self):
-        with self._cache_lock:
-            self._cache = {}
+        self.cache.clear()
+
+    def cache_stats(self):
+        return self.cache.stats()
 
     @torch.no_grad()
     def evaluate(self, board: chess.Board):
-        fen = board.fen()
+        key = position_key(board)
         
-        with self._cache_lock:
-            if fen in self._cache:
-                priors, value = self._cache[fen]
-                self.latest_value = value
-                return priors, value
+        hit = self.cache.get(key)
+        if hit is not None:
+            self.latest_value = hit[1]
+            return hit
+
+        return self._evaluate_uncached([(board, key)])[0]
+
+    @torch.no_grad()
+    def evaluate_batch(self, boards):
+        """
+        Evaluates several positions with a single network call (or a single
+        round of inference-server requests). Returns [(priors, value), ...].
+        """
+        results = [None] * len(boards)
+        misses, miss_idx = [], []
+        for i, board in enumerate(boards):
+            key = position_key(board)
+            hit = self.cache.get(key)
+            if hit is not None:
+                results[i] = hit
+            else:
+                misses.append((board, key))
+                miss_idx.append(i)
+
+        if misses:
+            for i, res in zip(miss_idx, self._evaluate_uncached(misses)):
+                results[i] = res
+        elif results:
+            self.latest_value = results[-1][1]
+        return results
+
+    async def evaluate_async(self, board: chess.Board):
+        """
+        Awaitable evaluation. Every coroutine that requests an evaluation in
+        the same event-loop pass joins one batch, which is evaluated with a
+        single network call (or server round trip) once they are all waiting.
+        The board must not be modified until the result arrives.
+        """
+        key = position_key(board)
+        hit = self.cache.get(key)
+        if hit is not None:
+            self.latest_value = hit[1]
+            return hit
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._async_pending:
+            # Runs after all coroutines already scheduled this pass have queued theirs
+            loop.call_soon(self._flush_async)
+        entry = self._async_pending.setdefault(key, (board, []))
+        entry[1].append(future) # Identical positions share one slot in the batch
+        return await future
+
+    @torch.no_grad()
+    def _flush_async(self):
+        pending, self._async_pending = self._async_pending, {}
+        items = [(board, key) for key, (board, _) in pending.items()]
+        try:
+            results = self._evaluate_uncached(items)
+        except Exception as e:
+            for _, futures in pending.values():
+                for f in futures:
+                    if not f.done():
+                        f.set_exception(e)
+            return
+
+        self.async_batches += 1
+        self.async_evals += len(items)
+        for (_, futures), res in zip(pending.values(), results):
+            for f in futures:
+                if not f.done():
+                    f.set_result(res)
+
+    def _evaluate_uncached(self, items):
+        start_time = time.time()
+        boards = [board for board, _ in items]
 
         if self.batch_mode:
-            res = self._evaluate_batched(board, fen)
+            results, versions = self._evaluate_batched(boards)
         else:
-            res = self._evaluate_local(board, fen)
-            
-        return res
+            results = self._evaluate_local(boards)
+            versions = [self.model_version] * len(results)
+
+        for (_, key), (priors, value), version in zip(items, results, versions):
+            self.cache.put(key, priors, value, version) # Dropped if the cache has moved to another model
 
-    def _evaluate_batched(self, board, fen):
-        req_id = str(uuid.uuid4())
-        encoded = self.encoder.encode(board)
-        
-        start_time = time.time()
-        self.task_queue.put((req_id, encoded))
-        
-        # Poll for result - Thread-safe polling
-        while req_id not in self.result_dict:
-            # Yield CPU so other simulation threads can work
-            time.sleep(0.0001)
-            
-        probs, value = self.result_dict.pop(req_id)
-        priors = self._process_outputs(board, probs)
-        
         self.last_inference_time = time.time() - start_time
-        self.latest_value = value
-        
-        with self._cache_lock:
-            self._cache[fen] = (priors, value)
-        return priors, value
+        self.latest_value = results[-1][1]
+        return results
 
-    def _evaluate_local(self, board, fen):
-        start_time = time.time()
-        encoded = self.encoder.encode(board)
-        tensor = torch.from_numpy(encoded).unsqueeze(0).to(self.device)
+    def _evaluate_batched(self, boards):
+        # Boards are encoded straight into this thread's shared-memory slots
+        # and the priors are read from the server's results in place.
+        # Returns the results and the model version behind each one.
+        results, versions = [], []
+        step = self.transport.max_batch
+        for i in range(0, len(boards), step):
+            chunk = boards[i:i + step]
+            with self.transport.request(len(chunk)) as req:
+                self.encoder.encode_batch(chunk, out=req.states)
+                moves, _, _ = self.encoder.legal_batch(chunk, out=req.legal, counts=req.num_legal)
+                req.submit() # Blocks until the server has answered
+                self._track_server_version(int(req.versions[0]))
+                # The server already normalized over the legal moves
+                results += [(dict(zip(legal, req.priors[j, :len(legal)].tolist())), float(req.values[j]))
+                            for j, legal in enumerate(moves)]
+                versions += req.versions.tolist()
+        return results, versions
+
+    def _track_server_version(self, version):
+        # The server hot-swaps weights; cached evaluations of the old net go with them
+        if version != self.model_version:
+            self.model_version = version
+            self.cache.set_version(version)
+
+    def _evaluate_local(self, boards):
+        tensor = torch.from_numpy(self.encoder.encode_batch(boards)).to(self.device)
+        moves, legal, counts = self.encoder.legal_batch(boards)
         
         logits, value_tensor = self.model(tensor)
-        probs = torch.softmax(logits, dim=1).squeeze(0).cpu().numpy()
-        value = float(value_tensor.item())
-        
-        priors = self._process_outputs(board, probs)
-        self.last_inference_time = time.time() - start_time
-        self.latest_value = value
-        
-        with self._cache_lock:
-            self._cache[fen] = (priors, value)
-        return priors, value
-
-    def _process_outputs(self, board, probs):
-        legal_moves = list(board.legal_moves)
-        priors = {}
-        for move in legal_moves:
-            # Consistent indexing: (from * 64) + to
-            idx = (move.from_square << 6) | move.to_square
-            priors[move] = float(probs[idx])
-
-        total_p = sum(priors.values())
-        if total_p > 1e-8:
-            inv_total = 1.0 / total_p
-            priors = {m: p * inv_total for m, p in priors.items()}
-        else:
-            priors = {m: 1.0 / len(legal_moves) for m in legal_moves}
-        return priors
\ No newline at end of file
+        priors = legal_softmax(logits, torch.from_numpy(legal).to(self.device), torch.from_numpy(counts).to(self.device)).cpu().numpy()
+        values = value_tensor.view(-1).cpu().numpy()
+        return [(dict(zip(m, priors[i, :len(m)].tolist())), float(values[i])) for i, m in enumerate(moves)]
@@ -0,0 +1,217 @@
+import os
+import copy
+import time
+import zipfile
+import warnings
+import numpy as np
+import chess
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from .model import AlphaNet
+from .encoder import AlphaZeroEncoder
+from .checkpoints import load_checkpoint
+
+# CPU inference artifacts: AlphaNet with BatchNorm folded into the convs,
+# channels-last activations and an optional lower precision, traced and
+# frozen to TorchScript. load_inference_model() loads either an artifact or a
+# checkpoint, so the inference server, AlphaZeroEvaluator and the chess app
+# can point at whichever exists. Artifacts are CPU-only and carry the version
+# of the checkpoint they were exported from.
+PRECISIONS = ("fp32", "bf16", "int8-dynamic", "int8-static")
+
+def fold_batchnorm(model):
+    """Eval-mode copy of an AlphaNet with every BatchNorm folded into the conv before it."""
+    model = copy.deepcopy(model).cpu().eval()
+    pairs = [(model, "conv_in", "bn_in"), (model, "pol_conv", "pol_bn"), (model, "val_conv", "val_bn")]
+    for block in model.res_blocks:
+        pairs += [(block, "conv1", "bn1"), (block, "conv2", "bn2")]
+    for owner, conv, bn in pairs:
+        setattr(owner, conv, fuse_conv_bn_eval(getattr(owner, conv), getattr(owner, bn)))
+        setattr(owner, bn, nn.Identity())
+    return model
+
+class CPUInferenceNet(nn.Module):
+    """Feeds the wrapped net channels-last input in `dtype` and returns float32 (logits, value)."""
+    def __init__(self, net, dtype=torch.float32):
+        super().__init__()
+        self.net = net
+        self.dtype = dtype
+
+    def forward(self, x):
+        p, v = self.net(x.to(self.dtype).contiguous(memory_format=torch.channels_last))
+        return p.float(), v.float()
+
+def export_model(model, precision="fp32", calibration=None):
+    """
+    Frozen TorchScript module for CPU inference. int8-static needs
+    `calibration`, an (N, 25, 8, 8) float32 array of typical positions.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore") # torch.ao.quantization deprecation notices
+        if precision == "int8-static":
+            if calibration is None:
+                raise ValueError("int8-static export needs calibration positions")
+            # FX quantization does its own conv+bn+relu fusion on the unfolded net
+            from torch.ao.quantization import get_default_qconfig_mapping
+            from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+            example = torch.from_numpy(calibration[:8])
+            prepared = prepare_fx(copy.deepcopy(model).cpu().eval(), get_default_qconfig_mapping("x86"), (example,))
+            with torch.no_grad():
+                for i in range(0, len(calibration), 256):
+                    prepared(torch.from_numpy(calibration[i:i + 256]))
+            net = CPUInferenceNet(convert_fx(prepared))
+        else:
+            folded = fold_batchnorm(model).to(memory_format=torch.channels_last)
+            if precision == "bf16":
+                net = CPUInferenceNet(folded.to(torch.bfloat16), torch.bfloat16)
+            elif precision == "int8-dynamic":
+                # Weights of the linear layers (mostly the 2048x4096 policy FC) go to int8
+                net = CPUInferenceNet(torch.ao.quantization.quantize_dynamic(folded, {nn.Linear}, dtype=torch.qint8))
+            else:
+                net = CPUInferenceNet(folded)
+
+        net.eval()
+        with torch.no_grad():
+            traced = torch.jit.trace(net, torch.zeros(2, 25, 8, 8))
+        return torch.jit.freeze(traced)
+
+def save_artifact(module, path, version=0):
+    tmp = path + ".tmp" # Readers never see a half-written artifact
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        torch.jit.save(module, tmp, _extra_files={"version": str(int(version))})
+    os.replace(tmp, path)
+
+def is_torchscript(path):
+    # TorchScript archives carry their code next to the weights; state_dict files don't
+    try:
+        with zipfile.ZipFile(path) as z:
+            return any(name.split("/", 1)[-1].startswith("code/") for name in z.namelist())
+    except zipfile.BadZipFile:
+        return False
+
+def load_inference_model(path, device="cpu"):
+    """
+    (model, version): an eval-mode model mapping planes to (logits, value),
+    from an exported artifact (a ScriptModule, always on CPU) or a checkpoint.
+    """
+    if is_torchscript(path):
+        extra = {"version": ""}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            model = torch.jit.load(path, map_location="cpu", _extra_files=extra)
+        return model, int(extra["version"] or 0)
+    state_dict, version = load_checkpoint(path, map_location=device)
+    model = AlphaNet(num_res_blocks=10, channels=128).to(device)
+    model.load_state_dict(state_dict)
+    return model.eval(), version
+
+def sample_positions(count, seed=0, buffer_path=None):
+    """
+    (count, 25, 8, 8) encoded positions: from replay files if buffer_path
+    has any, otherwise from random playouts of up to 80 plies.
+    """
+    if buffer_path and os.path.isdir(buffer_path):
+        from .replay import load_samples
+        encoder = AlphaZeroEncoder(history_len=2)
+        files = sorted(f for f in os.listdir(buffer_path) if f.endswith(".npz"))
+        rng = np.random.default_rng(seed)
+        parts, total = [], 0
+        for name in rng.permutation(files):
+            s = load_samples(os.path.join(buffer_path, name))
+            parts.append(encoder.unpack_batch(s["bitboards"], s["castling"], s["halfmove"]))
+            total += len(parts[-1])
+            if total >= count:
+                return np.concatenate(parts)[:count]
+
+    rng = np.random.default_rng(seed)
+    boards = []
+    for _ in range(count):
+        board = chess.Board()
+        for _ in range(rng.integers(0, 80)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(moves[rng.integers(len(moves))])
+        boards.append(board)
+    return AlphaZeroEncoder(history_len=2).encode_batch(boards)
+
+@torch.no_grad()
+def compare(reference, candidate, states, batch_size=256):
+    """Accuracy of `candidate` against `reference`: policy KL, top-1 agreement and value error."""
+    kl, agree, verr = [], [], []
+    for i in range(0, len(states), batch_size):
+        x = torch.from_numpy(states[i:i + batch_size])
+        p_ref, v_ref = reference(x)
+        p_cand, v_cand = candidate(x)
+        log_ref, log_cand = torch.log_softmax(p_ref.float(), 1), torch.log_softmax(p_cand.float(), 1)
+        kl.append((log_ref.exp() * (log_ref - log_cand)).sum(1))
+        agree.append(p_ref.argmax(1) == p_cand.argmax(1))
+        verr.append((v_ref.float() - v_cand.float()).abs().view(-1))
+    kl, agree, verr = torch.cat(kl), torch.cat(agree).float(), torch.cat(verr)
+    return {
+        "policy_kl": float(kl.mean()),
+        "policy_kl_max": float(kl.max()),
+        "top1_agreement": float(agree.mean()),
+        "value_mae": float(verr.mean()),
+        "value_max_err": float(verr.max()),
+    }
+
+@torch.no_grad()
+def throughput(model, states, batch_sizes=(1, 2, 4, 8, 16, 32, 64, 128, 256), min_time=0.5):
+    """Positions/sec of `model` at each batch size."""
+    rates = {}
+    for b in batch_sizes:
+        x = torch.from_numpy(np.resize(states, (b,) + states.shape[1:]))
+        model(x) # Warm-up (and TorchScript profiling runs)
+        model(x)
+        runs, start = 0, time.perf_counter()
+        while runs < 3 or time.perf_counter() - start < min_time:
+            model(x)
+            runs += 1
+        rates[b] = b * runs / (time.perf_counter() - start)
+    return rates
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export AlphaNet for CPU inference")
+    parser.add_argument("--model", default="models/best_model.pth")
+    parser.add_argument("--out", default=None, help="Default: <model>.<precision>.pt")
+    parser.add_argument("--precision", default="fp32", choices=PRECISIONS + ("all",))
+    parser.add_argument("--buffer", default="data/replay_buffer/", help="Positions for calibration and checks")
+    parser.add_argument("--positions", type=int, default=1024)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads for the benchmark")
+    parser.add_argument("--bench", action="store_true", help="Compare throughput at batch sizes 1-256")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    reference, version = AlphaNet(num_res_blocks=10, channels=128), 0
+    if os.path.exists(args.model):
+        state_dict, version = load_checkpoint(args.model)
+        reference.load_state_dict(state_dict)
+    else:
+        print(f"[Export] {args.model} not found, exporting a freshly initialized net")
+    reference.eval()
+
+    calibration = sample_positions(args.positions, seed=0, buffer_path=args.buffer)
+    checks = sample_positions(args.positions, seed=1, buffer_path=args.buffer)
+    precisions = PRECISIONS if args.precision == "all" else (args.precision,)
+    base = os.path.splitext(args.model)[0]
+
+    baseline = throughput(reference, checks) if args.bench else None
+    if baseline:
+        print("[Export] eager fp32: " + ", ".join(f"{b}: {r:.0f}/s" for b, r in baseline.items()))
+    for precision in precisions:
+        module = export_model(reference, precision, calibration)
+        out = args.out if args.out and len(precisions) == 1 else f"{base}.{precision}.pt"
+        save_artifact(module, out, version)
+        acc = compare(reference, module, checks)
+        print(f"[Export] {precision} v{version} -> {out} | KL {acc['policy_kl']:.2e} (max {acc['policy_kl_max']:.2e}), "
+              f"top-1 {acc['top1_agreement']:.1%}, value MAE {acc['value_mae']:.2e} (max {acc['value_max_err']:.2e})")
+        if baseline:
+            rates = throughput(module, checks)
+            print(f"[Export] {precision}: " + ", ".join(f"{b}: {r:.0f}/s ({r / baseline[b]:.2f}x)" for b, r in rates.items()))
@@ -1,77 +1,141 @@
 import torch
 import multiprocessing as mp
-import numpy as np
 import time
+import threading
+from .scheduler import AdaptiveBatcher
+from .checkpoints import file_stamp
+from .cache import ResultCache
+from .model import AlphaNet, legal_softmax
+from .export import load_inference_model
 
-def inference_worker(model_path, device, task_queue, result_dict):
+def inference_worker(model_path, device, transport, stats=None, cache_mb=256):
     """
-    The GPU Master process. 
-    Optimized for dynamic batching to maximize throughput.
+    The GPU Master process.
+    Optimized for dynamic batching to maximize throughput; the batch size
+    and queueing delay are tuned online (see AdaptiveBatcher). New
+    checkpoints at model_path are picked up without a restart. Positions
+    repeated across actors are evaluated once (see ResultCache); cache_mb=0
+    turns that off.
     """
-    # Import inside the function to avoid CUDA/MPS initialization issues in the main process
-    from .model import AlphaNet
-    
     print(f"[Inference] Initializing model on {device}...")
-    model = AlphaNet(num_res_blocks=10, channels=128).to(device)
-    
-    # Load model with weights
-    try:
-        model.load_state_dict(torch.load(model_path, map_location=device))
-    except Exception as e:
-        print(f"[Inference] Warning: Could not load model weights: {e}")
-    
-    model.eval()
-
-    # Settings for high-throughput
-    BATCH_SIZE = 64
-    WAIT_TIMEOUT = 0.001 # 1ms window to allow queue to fill up
-    
-    print(f"[Inference] Server is active. Batch Size: {BATCH_SIZE}")
+    model = HotSwapModel(model_path, device)
+    serve(transport, model.run_batch, stats, cache=ResultCache(cache_mb) if cache_mb else None, swap=model.maybe_swap)
 
-    while True:
-        batch = []
-        ids = []
-        
-        # 1. Block until at least ONE task is available
-        # This prevents the loop from spinning at 100% CPU when idle
+class HotSwapModel:
+    """
+    The network the server runs. A watcher thread polls the checkpoint (a
+    state_dict or a CPU artifact from algorithm/export.py), loads a new
+    version in the background and leaves it for run_batch() to swap in,
+    so a swap only ever happens between batches.
+    """
+    def __init__(self, path, device, poll_interval=2.0):
+        self.path = path
+        self.device = device
+        self.poll_interval = poll_interval
+        self.swaps = 0
+        self._stamp = file_stamp(path)
+        self._next = None
+
+        # Load model with weights
         try:
-            task_id, state = task_queue.get(timeout=1.0)
-            batch.append(state)
-            ids.append(task_id)
-        except:
-            continue # No tasks for 1 second, just loop back
-
-        # 2. Dynamic Batching: Try to fill the rest of the batch
-        # We wait a tiny bit to see if more tasks arrive from other workers
-        start_wait = time.time()
-        while len(batch) < BATCH_SIZE:
+            self.model, self.version = self._load()
+        except Exception as e:
+            print(f"[Inference] Warning: Could not load model weights: {e}")
+            self.model, self.version = AlphaNet(num_res_blocks=10, channels=128).to(device).eval(), 0
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _load(self):
+        model, version = load_inference_model(self.path, self.device)
+        if isinstance(model, torch.jit.ScriptModule):
+            self.device = "cpu" # Exported artifacts only run on CPU
+        return model, version
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            stamp = file_stamp(self.path)
+            if stamp is None or stamp == self._stamp:
+                continue
             try:
-                # Non-blocking attempt to grab more tasks
-                task_id, state = task_queue.get_nowait()
-                batch.append(state)
-                ids.append(task_id)
-            except:
-                # If queue is empty, wait a tiny bit for threads to catch up
-                if time.time() - start_wait < WAIT_TIMEOUT:
-                    time.sleep(0.0001) 
-                    continue
-                else:
-                    break # Timeout reached, process what we have
-
-        # 3. Batch Inference
-        if batch:
-            with torch.no_grad():
-                # Convert list of numpy arrays to a single tensor
-                # Note: np.array(batch) is fast here
-                tensors = torch.from_numpy(np.stack(batch)).to(device)
-                
-                logits, values = model(tensors)
-                
-                # Softmax for probabilities and move to CPU
-                probs = torch.softmax(logits, dim=1).cpu().numpy()
-                vals = values.cpu().numpy()
-                
-                # 4. Distribute results back to workers
-                # The shared result_dict is the bottleneck here, so we do it fast
-                for i, tid in enumerate(ids):
-                    result_dict[tid] = (probs[i], float(vals[i]))
\ No newline at end of file
+                # Checkpoints are replaced atomically, so this never sees a partial file
+                loaded = self._load()
+            except Exception as e:
+                print(f"[Inference] Warning: Could not load new checkpoint: {e}")
+                continue
+            self._stamp = stamp
+            self._next = loaded
+
+    def maybe_swap(self):
+        """Swaps in a model the watcher has loaded, if any; returns the version now served."""
+        if self._next is not None:
+            (self.model, self.version), self._next = self._next, None
+            self.swaps += 1
+            print(f"[Inference] Swapped in model v{self.version}")
+        return self.version
+
+    @torch.no_grad()
+    def run_batch(self, states, legal, counts):
+        self.maybe_swap()
+
+        # The planes are read straight from shared memory (no copy for a single request)
+        logits, values = self.model(torch.from_numpy(states).to(self.device))
+
+        # Softmax over the legal moves only, for the whole batch on the device; only those priors go back
+        legal = torch.from_numpy(legal).to(self.device)
+        counts = torch.from_numpy(counts).to(self.device)
+        priors = legal_softmax(logits, legal, counts).cpu().numpy()
+        return priors, values.view(-1).cpu().numpy(), self.version
+
+def serve(transport, run_batch, stats=None, batcher=None, cache=None, swap=None):
+    """
+    Request loop of the inference server. run_batch(states, legal, counts)
+    maps (N, planes, 8, 8) planes and the legal move indices and counts to
+    (priors (N, MAX_LEGAL), values (N,), model version) and every result is
+    tagged with that version. With a ResultCache, batches
+    go through cache.run() instead, which skips repeated positions; swap()
+    (HotSwapModel.maybe_swap) is then called before each batch so a new
+    model replaces cached results even when every position hits. A receiving
+    thread queues requests into the AdaptiveBatcher while this thread runs
+    the model, so the next batch is collected during the current one.
+    Batching stats are published to stats["inference"] about once a second.
+    """
+    batcher = batcher or AdaptiveBatcher()
+
+    def receive():
+        while True:
+            # Block until a request is available; the timeout only keeps the thread responsive
+            request = transport.get_request(timeout=1.0)
+            if request is None:
+                continue
+            if request == "stop":
+                batcher.close()
+                return
+            batcher.add(request, request[2], sent=request[3])
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+    print(f"[Inference] Server is active. Adaptive batching up to {batcher.max_batch}")
+
+    last_publish = time.time()
+    while True:
+        # 1. Wait for the scheduler to release a batch
+        batch = batcher.next_batch()
+        if batch is None:
+            break
+        requests = [request for request, _, _ in batch]
+
+        # 2. Batch Inference
+        start = time.time()
+        inputs = transport.gather(requests)
+        if cache and swap:
+            cache.set_version(swap())
+        priors, vals, version = cache.run(inputs, run_batch) if cache else run_batch(*inputs)
+
+        # 3. Write results into the clients' slots and wake them
+        transport.respond(requests, priors, vals, version)
+        batcher.done(batch, time.time() - start)
+
+        if stats is not None and time.time() - last_publish > 1.0:
+            stats["inference"] = dict(batcher.stats(), model_version=version, cache=cache.stats() if cache else None)
+            last_publish = time.time()
+    receiver.join()
@@ -49,13 +49,25 @@ class AlphaNet(nn.Module):
         
         # Policy Head
         p = F.relu(self.pol_bn(self.pol_conv(x)))
-        p = p.view(p.size(0), -1)
+        p = p.flatten(1) # Not view(): channels-last / quantized activations aren't NCHW-contiguous
         p = self.pol_fc(p) 
         
         # Value Head: Removed extra ReLUs and BatchNorms that cause saturation
         v = F.relu(self.val_bn(self.val_conv(x)))
-        v = v.view(v.size(0), -1)
+        v = v.flatten(1)
         v = F.relu(self.val_fc1(v))
         v = torch.tanh(self.val_fc2(v)) # tanh maps to [-1, 1]
         
-        return p, v
\ No newline at end of file
+        return p, v
+
+
+def legal_softmax(logits, legal, counts):
+    """
+    Policy over legal moves only: softmax of the logits gathered at `legal`
+    ((N, K) policy indices, padded past `counts`). Returns (N, K) float32
+    priors, zero in the padding.
+    """
+    picked = logits.float().gather(1, legal.long())
+    mask = torch.arange(legal.shape[1], device=legal.device)[None, :] < counts[:, None]
+    picked = picked.masked_fill(~mask, float("-inf"))
+    return torch.softmax(picked, dim=1).nan_to_num(0.0) # Rows with no legal moves come out NaN
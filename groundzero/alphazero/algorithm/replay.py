@@ -0,0 +1,113 @@
+import os
+import glob
+import numpy as np
+from .encoder import AlphaZeroEncoder
+
+# Replay files hold packed positions (see AlphaZeroEncoder.pack_batch):
+#   bitboards (N, 24) uint64, castling (N,) uint8, halfmove (N,) uint16,
+# sparse policy targets pi_idx (N, POLICY_WIDTH) int16 / pi_prob float32
+# (padded with index 0, probability 0), outcomes 'zs' and the version of the
+# network whose search produced each sample, 'model_versions' (-1 if
+# unknown). Older files store
+# full 'states' planes and dense 4096-wide 'pis'; load_samples() converts
+# those on the fly.
+_encoder = AlphaZeroEncoder(history_len=2)
+
+# Policy entries kept per sample. Searches rarely visit more than a few
+# dozen moves, so the top-64 almost always hold the whole distribution.
+POLICY_WIDTH = 64
+
+def move_index(move):
+    # Consistent indexing: (from * 64) + to
+    return (move.from_square << 6) | move.to_square
+
+def sparse_policy(pi_dist, width=POLICY_WIDTH):
+    """
+    (idx int16 (width,), prob float32 (width,)) for a {move: prob} dict.
+    Promotions to different pieces share an index and are summed; if more
+    than `width` indices remain, the top ones are kept and renormalized.
+    """
+    dense = np.zeros(4096, dtype=np.float32)
+    for move, prob in pi_dist.items():
+        dense[move_index(move)] += prob
+    idx, prob = sparsify(dense[None], width)
+    return idx[0], prob[0]
+
+def sparsify(pis, width=POLICY_WIDTH):
+    """Top-`width` (index, probability) pairs of dense (N, 4096) policy targets, renormalized."""
+    pis = np.asarray(pis, dtype=np.float32)
+    top = np.argpartition(pis, -width, axis=1)[:, -width:]
+    prob = np.take_along_axis(pis, top, axis=1)
+    order = np.argsort(-prob, axis=1, kind="stable") # Largest first, padding last
+    top = np.take_along_axis(top, order, axis=1)
+    prob = np.take_along_axis(prob, order, axis=1)
+
+    total = prob.sum(axis=1, keepdims=True)
+    full = pis.sum(axis=1, keepdims=True)
+    # Only renormalize rows that actually lost mass to the cut
+    prob = np.where(total < full, prob * (full / np.maximum(total, 1e-12)), prob).astype(np.float32)
+    top[prob == 0] = 0
+    return top.astype(np.int16), prob
+
+def save_samples(path, bitboards, castling, halfmove, pi_idx, pi_prob, zs, model_versions=None):
+    if model_versions is None:
+        model_versions = np.full(len(zs), -1)
+    np.savez_compressed(
+        path,
+        bitboards=np.asarray(bitboards, dtype=np.uint64),
+        castling=np.asarray(castling, dtype=np.uint8),
+        halfmove=np.asarray(halfmove, dtype=np.uint16),
+        pi_idx=np.asarray(pi_idx, dtype=np.int16),
+        pi_prob=np.asarray(pi_prob, dtype=np.float32),
+        zs=np.asarray(zs, dtype=np.float32),
+        model_versions=np.asarray(model_versions, dtype=np.int32)
+    )
+
+def load_samples(path):
+    """Reads a replay file as a dict of packed arrays, whatever format it was written in."""
+    with np.load(path) as data:
+        if 'states' in data:
+            bitboards, castling, halfmove = _encoder.pack_planes(data['states'])
+        else:
+            bitboards, castling, halfmove = data['bitboards'], data['castling'], data['halfmove']
+        if 'pis' in data:
+            pi_idx, pi_prob = sparsify(data['pis'])
+        else:
+            pi_idx, pi_prob = data['pi_idx'], data['pi_prob']
+        return {
+            "bitboards": bitboards,
+            "castling": castling,
+            "halfmove": halfmove,
+            "pi_idx": pi_idx,
+            "pi_prob": pi_prob,
+            "zs": data['zs'],
+            "model_versions": data['model_versions'] if 'model_versions' in data else np.full(len(data['zs']), -1, dtype=np.int32),
+        }
+
+def is_legacy(path):
+    with np.load(path) as data:
+        return 'states' in data or 'pis' in data
+
+def convert_buffer(buffer_path):
+    """Rewrites every legacy replay file in buffer_path in the packed format. Returns the count."""
+    converted = 0
+    for path in glob.glob(os.path.join(buffer_path, "*.npz")):
+        try:
+            if not is_legacy(path):
+                continue
+            samples = load_samples(path)
+            mtime = os.path.getmtime(path)
+            tmp = path + ".tmp" # Not *.npz, so readers never pick up a half-written file
+            with open(tmp, "wb") as f:
+                save_samples(f, **samples)
+            os.replace(tmp, path)
+            os.utime(path, (mtime, mtime)) # Keep the age order the trainer relies on
+            converted += 1
+        except Exception as e:
+            print(f"[Replay] Skipping {os.path.basename(path)}: {e}")
+    return converted
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/replay_buffer/"
+    print(f"[Replay] Converted {convert_buffer(path)} legacy files in {path}")
@@ -0,0 +1,172 @@
+import time
+import threading
+import numpy as np
+from collections import Counter, deque
+
+class AdaptiveBatcher:
+    """
+    Decides when the inference server runs its next batch and how large it
+    may be, tuning both online:
+
+    - batch_limit (AIMD): grows while batches come out full, and shrinks
+      by a quarter when, with nothing else queued, running the batch alone
+      took more than half of target_latency_ms. With a backlog it only
+      grows: the server is the bottleneck, and larger batches cut both the
+      cost per position and the time the backlog takes to clear. It also
+      stops shrinking if even single positions miss the target (slow
+      hardware), where throughput is all there is left to win.
+    - max_delay (how long a partial batch waits for more requests): hill
+      climbs on measured evals/sec. Every window it keeps moving the
+      delay in the direction that improved throughput and reverses
+      otherwise. Any request over the latency target halves it, unless
+      the target is out of reach anyway.
+
+    Requests are queued with add() by a receiving thread while the model
+    thread runs the previous batch, so the next batch is already
+    collected when the model is free; next_batch() only waits when the
+    queue is short.
+    """
+    def __init__(self, target_latency_ms=50.0, max_batch=256, max_delay_ms=8.0, window=0.5):
+        self.target = target_latency_ms / 1000
+        self.max_batch = max_batch
+        self.max_delay_cap = max_delay_ms / 1000
+        self.batch_limit = 16
+        self.max_delay = 0.001
+
+        self._pending = deque() # (request, count, received)
+        self._pending_count = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Delay hill climbing state
+        self._window = window
+        self._fit = np.zeros(5) # Decayed sums of 1, size, time, size^2, size*time
+        self._window_start = time.time()
+        self._window_evals = 0
+        self._last_rate = None
+        self._direction = 1
+
+        # Exported stats
+        self.batches = 0
+        self.evals = 0
+        self.start_time = time.time()
+        self.batch_sizes = Counter() # Power-of-two bucket -> batches
+        self.latencies = deque(maxlen=4096) # Seconds from client submit to response, per request
+        self.queue_depths = deque(maxlen=1024) # Positions left waiting when a batch starts
+
+    # --- Receiving thread ---
+
+    def add(self, request, count, sent=None):
+        now = time.time()
+        with self._cond:
+            self._pending.append((request, count, sent if sent is not None else now))
+            self._pending_count += count
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    # --- Model thread ---
+
+    def next_batch(self):
+        """
+        Blocks until a batch is due and returns [(request, count, sent), ...],
+        or None once closed and drained.
+        """
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+            # Wait for the batch to fill, but never hold the oldest request past max_delay
+            deadline = self._pending[0][2] + self.max_delay
+            while self._pending_count < self.batch_limit and not self._closed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size = [], 0
+            while self._pending and (not batch or size + self._pending[0][1] <= self.batch_limit):
+                item = self._pending.popleft()
+                batch.append(item)
+                size += item[1]
+            self._pending_count -= size
+            self.queue_depths.append(self._pending_count)
+        return batch
+
+    def done(self, batch, run_time):
+        """Records a finished batch (run_time: seconds spent running it) and retunes the limits."""
+        now = time.time()
+        size = sum(count for _, count, _ in batch)
+        worst = 0.0
+        for _, _, sent in batch:
+            latency = now - sent
+            self.latencies.append(latency)
+            worst = max(worst, latency)
+
+        self.batches += 1
+        self.evals += size
+        self.batch_sizes[_bucket(size)] += 1
+
+        # 1. Batch limit: additive increase while batches fill, cut when one is too slow to run
+        self._fit = 0.98 * self._fit + (1, size, run_time, size * size, size * run_time)
+        feasible = self._fixed_cost() < self.target / 2
+        if worst > self.target and feasible:
+            self.max_delay = max(0.00005, self.max_delay * 0.5)
+        backlog = self.queue_depths[-1] if self.queue_depths else 0
+        if run_time > self.target / 2 and not backlog and feasible:
+            self.batch_limit = max(1, int(self.batch_limit * 0.75))
+        elif size >= self.batch_limit:
+            self.batch_limit = min(self.max_batch, self.batch_limit + max(1, self.batch_limit // 8))
+
+        # 2. Delay: perturb and observe on throughput over each window
+        self._window_evals += size
+        elapsed = now - self._window_start
+        if elapsed >= self._window:
+            rate = self._window_evals / elapsed
+            if self._last_rate is not None and rate < self._last_rate:
+                self._direction = -self._direction
+            self._last_rate = rate
+            step = 1.25 if self._direction > 0 else 0.8
+            self.max_delay = min(self.max_delay_cap, max(0.00005, self.max_delay * step))
+            self._window_start, self._window_evals = now, 0
+
+    def _fixed_cost(self):
+        # Intercept of run_time ~ a + b * size: what even a one-position batch costs
+        n, x, y, xx, xy = self._fit
+        var = n * xx - x * x
+        if var < 1e-9 * n * n:
+            return 0.0 # All batches the same size so far: assume smaller ones are cheaper
+        slope = (n * xy - x * y) / var
+        return max(0.0, (y - slope * x) / n)
+
+    def stats(self):
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        depths = self.queue_depths or [0]
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return {
+            "batches": self.batches,
+            "evals": self.evals,
+            "evals_per_sec": round(self.evals / elapsed, 1),
+            "mean_batch": round(self.evals / max(self.batches, 1), 2),
+            "batch_limit": self.batch_limit,
+            "max_delay_ms": round(self.max_delay * 1000, 3),
+            "batch_histogram": {label: self.batch_sizes[label] for label in _BUCKETS if self.batch_sizes[label]},
+            "queue_depth": self._pending_count,
+            "queue_depth_mean": round(float(np.mean(depths)), 2),
+            "queue_depth_max": int(max(depths)),
+            "latency_p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "latency_p95_ms": round(float(np.percentile(lat, 95)), 3),
+            "latency_p99_ms": round(float(np.percentile(lat, 99)), 3),
+        }
+
+_BUCKETS = ["1", "2", "3-4", "5-8", "9-16", "17-32", "33-64", "65-128", "129-256", "257+"]
+
+def _bucket(size):
+    # Power-of-two histogram buckets
+    i = min(max(size - 1, 0).bit_length(), len(_BUCKETS) - 1)
+    return _BUCKETS[i]
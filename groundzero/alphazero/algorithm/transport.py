@@ -0,0 +1,304 @@
+import time
+import queue
+import threading
+import numpy as np
+import multiprocessing as mp
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from .encoder import MAX_LEGAL
+
+_ARRAYS = ("states", "legal", "num_legal", "priors", "values", "versions") # Views into the shared block
+
+class SharedTransport:
+    """
+    Request/response transport between actor processes and the inference
+    server built on one shared-memory block. Every client (actor process)
+    owns a range of slots, each holding one encoded position with its
+    legal move indices and its result, plus a few notification channels
+    (one per concurrent request).
+
+    A request is written straight into the client's slots, then only
+    (channel, first slot, count, send time) goes through the request queue; the client
+    blocks on its channel's semaphore until the server has written the
+    priors of the legal moves and the values back into the same slots.
+    Nothing is pickled per position and nothing polls. priors_dtype=np.float16
+    halves the size of the results.
+
+    Create it in the parent before starting any process, pass it to the
+    server and the actors as a Process argument, and call client(i) in
+    actor i.
+    """
+    def __init__(self, num_clients, slots_per_client=64, channels_per_client=16, num_planes=25, priors_dtype=np.float32):
+        self.num_clients = num_clients
+        self.slots_per_client = slots_per_client
+        self.channels_per_client = channels_per_client
+        self.num_planes = num_planes
+        self.priors_dtype = np.dtype(priors_dtype)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self._layout()[1])
+        self._owner = True
+        self._map_arrays()
+        self.requests = mp.Queue()
+        self.ready = [mp.Semaphore(0) for _ in range(num_clients * channels_per_client)]
+
+    def _layout(self):
+        slots = self.num_clients * self.slots_per_client
+        specs = [
+            ("states", (slots, self.num_planes, 8, 8), np.float32),
+            ("legal", (slots, MAX_LEGAL), np.int16), # Policy indices of the legal moves, zero-padded
+            ("num_legal", (slots,), np.int16),
+            ("priors", (slots, MAX_LEGAL), self.priors_dtype), # Softmax over the legal moves only
+            ("values", (slots,), np.float32),
+            ("versions", (slots,), np.int64), # Model version that produced each result
+        ]
+        layout, offset = [], 0
+        for name, shape, dtype in specs:
+            layout.append((name, shape, dtype, offset))
+            offset += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 64) * 64 # Keep arrays 64-byte aligned
+        return layout, offset
+
+    def _map_arrays(self):
+        for name, shape, dtype, offset in self._layout()[0]:
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset))
+
+    def __getstate__(self):
+        state = {k: v for k, v in self.__dict__.items() if k not in ("_shm",) + _ARRAYS}
+        state["_shm_name"] = self._shm.name
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        name = state.pop("_shm_name")
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=name)
+        self._map_arrays()
+
+    def client(self, client_id):
+        return TransportClient(self, client_id)
+
+    # --- Server side ---
+
+    def get_request(self, timeout=None):
+        """The next (channel, start, count, sent) request, or None on timeout."""
+        try:
+            return self.requests.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def gather(self, batch):
+        """
+        (planes, legal move indices, legal move counts) of a list of requests,
+        each as one array (views when there is only one request).
+        """
+        arrays = (self.states, self.legal, self.num_legal)
+        if len(batch) == 1:
+            _, start, count, _ = batch[0]
+            return tuple(a[start:start + count] for a in arrays)
+        return tuple(np.concatenate([a[start:start + count] for _, start, count, _ in batch]) for a in arrays)
+
+    def respond(self, batch, priors, values, version=0):
+        """Writes results for `batch` (in gather order) and wakes the waiting clients."""
+        offset = 0
+        for channel, start, count, _ in batch:
+            self.priors[start:start + count] = priors[offset:offset + count]
+            self.values[start:start + count] = values[offset:offset + count]
+            self.versions[start:start + count] = version
+            offset += count
+            self.ready[channel].release()
+
+    def shutdown(self):
+        """Makes the server loop return after answering the requests ahead of it."""
+        self.requests.put("stop")
+
+    def close(self):
+        # Views into the buffer have to go before it can be closed
+        for name in _ARRAYS:
+            self.__dict__.pop(name, None)
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+class TransportClient:
+    """
+    One actor's end of a SharedTransport. Thread-safe: concurrent requests
+    get their own slots and channel, and wait for a free one if needed.
+    """
+    def __init__(self, transport, client_id):
+        self.transport = transport
+        self.max_batch = transport.slots_per_client
+        self._base = client_id * transport.slots_per_client
+        self._used = np.zeros(transport.slots_per_client, dtype=bool)
+        first = client_id * transport.channels_per_client
+        self._channels = list(range(first, first + transport.channels_per_client))
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def request(self, count):
+        """
+        Reserves `count` (<= max_batch) contiguous slots and a channel. The
+        yielded request exposes them as .states/.legal/.num_legal (inputs) and
+        .priors/.values/.versions (results); fill the inputs (see
+        AlphaZeroEncoder.encode_batch and legal_batch), call submit(), and
+        read the results before leaving the block.
+        """
+        with self._cond:
+            while True:
+                start = self._find_free(count)
+                if start is not None and self._channels:
+                    break
+                self._cond.wait()
+            self._used[start:start + count] = True
+            channel = self._channels.pop()
+        try:
+            yield _Request(self.transport, channel, self._base + start, count)
+        finally:
+            with self._cond:
+                self._used[start:start + count] = False
+                self._channels.append(channel)
+                self._cond.notify_all()
+
+    def _find_free(self, count):
+        # First-fit run of `count` free slots
+        run = 0
+        for i, used in enumerate(self._used):
+            run = 0 if used else run + 1
+            if run == count:
+                return i - count + 1
+        return None
+
+class _Request:
+    def __init__(self, transport, channel, start, count):
+        self._transport = transport
+        self._channel = channel
+        self._start, self._count = start, count
+        self.states = transport.states[start:start + count]
+        self.legal = transport.legal[start:start + count]
+        self.num_legal = transport.num_legal[start:start + count]
+        self.priors = transport.priors[start:start + count]
+        self.values = transport.values[start:start + count]
+        self.versions = transport.versions[start:start + count]
+
+    def submit(self):
+        """Hands the request to the server and blocks until its results are in."""
+        self._transport.requests.put((self._channel, self._start, self._count, time.time()))
+        self._transport.ready[self._channel].acquire()
+
+# --- Microbenchmark: round trips through this transport vs. the previous
+# mp.Queue + Manager().dict() protocol, with a null model so only the IPC
+# is measured. Run from groundzero/alphazero: python -m algorithm.transport
+
+def _null_model(states, legal, counts):
+    n = len(states)
+    return np.full((n, MAX_LEGAL), 1.0 / 32, dtype=np.float32), np.zeros(n, dtype=np.float32), 0
+
+def _shm_server(transport):
+    from .inference_server import serve
+    serve(transport, _null_model)
+
+def _shm_client(transport, client_id, threads, batch, requests, out):
+    client = transport.client(client_id)
+    states = np.random.rand(batch, transport.num_planes, 8, 8).astype(np.float32)
+
+    def run(latencies):
+        for _ in range(requests):
+            start = time.perf_counter()
+            with client.request(batch) as req:
+                req.states[:] = states # Stands in for encode_batch(out=req.states)
+                req.num_legal[:] = 32 # and legal_batch()
+                req.submit()
+                float(req.priors[0, 0])
+            latencies.append(time.perf_counter() - start)
+    run([]) # Warm-up: also waits for the server to come up
+    out.put(_run_threads(run, threads))
+
+def _legacy_server(task_queue, result_dict):
+    while True:
+        batch, ids = [], []
+        try:
+            task_id, state = task_queue.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if task_id == "stop":
+            return
+        batch.append(state)
+        ids.append(task_id)
+        start_wait = time.time()
+        while len(batch) < 64:
+            try:
+                task_id, state = task_queue.get_nowait()
+                batch.append(state)
+                ids.append(task_id)
+            except queue.Empty:
+                if time.time() - start_wait < 0.001:
+                    time.sleep(0.0001)
+                    continue
+                break
+        probs, vals = np.full((len(batch), 4096), 1.0 / 4096, dtype=np.float32), np.zeros(len(batch), dtype=np.float32)
+        for i, tid in enumerate(ids):
+            result_dict[tid] = (probs[i], float(vals[i]))
+
+def _legacy_client(task_queue, result_dict, threads, batch, requests, out):
+    import uuid
+    states = np.random.rand(batch, 25, 8, 8).astype(np.float32)
+
+    def run(latencies):
+        for _ in range(requests):
+            start = time.perf_counter()
+            req_ids = [str(uuid.uuid4()) for _ in states]
+            for req_id, state in zip(req_ids, states):
+                task_queue.put((req_id, state))
+            for req_id in req_ids:
+                while req_id not in result_dict:
+                    time.sleep(0.0001)
+                result_dict.pop(req_id)
+            latencies.append(time.perf_counter() - start)
+    run([])
+    out.put(_run_threads(run, threads))
+
+def _run_threads(run, threads):
+    # (start, end, latencies); the wall clock lets the parent leave out process startup
+    latencies = [[] for _ in range(threads)]
+    pool = [threading.Thread(target=run, args=(lat,)) for lat in latencies]
+    start = time.time()
+    for t in pool: t.start()
+    for t in pool: t.join()
+    return start, time.time(), [x for lat in latencies for x in lat]
+
+def _bench(mode, workers, threads, batch, requests):
+    out = mp.Queue()
+    if mode == "shm":
+        transport = SharedTransport(workers, slots_per_client=max(64, batch * threads), channels_per_client=threads)
+        server = mp.Process(target=_shm_server, args=(transport,), daemon=True)
+        clients = [mp.Process(target=_shm_client, args=(transport, i, threads, batch, requests, out)) for i in range(workers)]
+    else:
+        manager = mp.Manager()
+        task_queue, result_dict = mp.Queue(maxsize=256), manager.dict()
+        server = mp.Process(target=_legacy_server, args=(task_queue, result_dict), daemon=True)
+        clients = [mp.Process(target=_legacy_client, args=(task_queue, result_dict, threads, batch, requests, out)) for _ in range(workers)]
+    server.start()
+    for p in clients: p.start()
+    runs = [out.get() for _ in clients]
+    for p in clients: p.join()
+    latencies = [x for _, _, lat in runs for x in lat]
+    elapsed = max(end for _, end, _ in runs) - min(start for start, _, _ in runs)
+
+    if mode == "shm":
+        transport.shutdown()
+        server.join()
+        transport.close()
+    else:
+        task_queue.put(("stop", None))
+        server.join()
+        manager.shutdown()
+    ms = np.array(latencies) * 1000
+    return {"p50_ms": np.percentile(ms, 50), "p99_ms": np.percentile(ms, 99),
+            "evals_per_sec": len(latencies) * batch / elapsed}
+
+if __name__ == "__main__":
+    mp.set_start_method("spawn", force=True)
+    for workers, threads, batch in ((1, 1, 1), (4, 4, 1), (4, 1, 16), (8, 2, 8)):
+        line = f"{workers} workers x {threads} threads, batch {batch:>2}:"
+        for mode in ("legacy", "shm"):
+            r = _bench(mode, workers, threads, batch, requests=200)
+            line += f" | {mode} p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms, {r['evals_per_sec']:.0f} evals/s"
+        print(line)
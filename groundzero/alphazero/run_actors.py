@@ -3,7 +3,6 @@ import time
 import torch
 import multiprocessing as mp
 import sys
-import uuid
 
 # Setup paths
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,6 +13,8 @@ if root_dir not in sys.path:
 from algorithm.model import AlphaNet
 from algorithm.collector import DataCollector
 from algorithm.inference_server import inference_worker
+from algorithm.transport import SharedTransport
+from algorithm.checkpoints import save_checkpoint
 from training_dashboard.dashboard_app import run_dashboard_server
 
 def bootstrap_model(path):
@@ -21,21 +22,35 @@ def bootstrap_model(path):
         print(f"[*] Initializing new 'brain' at {path}...")
         os.makedirs(os.path.dirname(path), exist_ok=True)
         model = AlphaNet(num_res_blocks=10, channels=128)
-        torch.save(model.state_dict(), path)
+        save_checkpoint(model.state_dict(), path, version=0)
 
-def worker_task(worker_id, model_path, shared_stats, task_queue, result_dict):
+def worker_task(worker_id, shared_stats, transport, games_per_process=1):
     """
-    Worker process. Note: It no longer loads the model itself.
-    It passes the task_queue to the evaluator.
+    Worker process. Note: It no longer loads the model itself; the
+    inference server owns the weights and swaps in new checkpoints.
+    It hands its end of the shared-memory transport to the evaluator.
+    With games_per_process > 1 the worker advances that many games at once,
+    batching the leaves of all of them into each inference request.
     """
     # M1 Mac Optimization: The collector uses the CPU for MCTS logic, 
-    # but the evaluator sends requests to the GPU process via queues.
-    collector = DataCollector(model_path=model_path, device="cpu")
+    # but the evaluator sends requests to the GPU process via shared memory.
+    collector = DataCollector(model_path=None, device="cpu")
     
-    # Inject the batching queues into the evaluator
-    collector.evaluator.set_batch_mode(task_queue, result_dict)
+    # Inject this worker's slots into the evaluator
+    collector.evaluator.set_batch_mode(transport.client(worker_id))
 
     print(f"[Worker {worker_id}] Starting batched self-play...")
+
+    if games_per_process > 1:
+        def on_game(game_data):
+            timestamp = int(time.time() * 1000)
+            collector.save_batch(game_data, f"batch_{worker_id}_{timestamp}.npz")
+            rate = collector.throughput()
+            print(f"[Worker {worker_id}] Game finished. Buffer: {len(game_data)} | "
+                  f"{rate['games_per_hour']} games/h, {rate['positions_per_sec']} pos/s")
+
+        collector.collect_games(games_per_process, worker_id=worker_id, stats=shared_stats, on_game=on_game)
+        return
     
     while True:
         shared_stats[worker_id] = {
@@ -53,30 +68,37 @@ def worker_task(worker_id, model_path, shared_stats, task_queue, result_dict):
         filename = f"batch_{worker_id}_{timestamp}.npz"
         collector.save_batch(game_data, filename)
         
-        print(f"[Worker {worker_id}] Game finished ({duration:.1f}s). Buffer: {len(game_data)}")
-        
-        # In batch mode, the inference server reloads the model, 
-        # so workers don't need to update locally as often.
-        collector.update_model(model_path)
+        rate = collector.throughput()
+        print(f"[Worker {worker_id}] Game finished ({duration:.1f}s). Buffer: {len(game_data)} | "
+              f"{rate['games_per_hour']} games/h, {rate['positions_per_sec']} pos/s")
+        # No reload here: every result already comes from the server's current model
 
 if __name__ == "__main__":
     mp.set_start_method('spawn', force=True) # Required for MPS/GPU on Mac
     
     MODEL_PATH = "models/best_model.pth"
+    # What the inference server runs; on CPU-only boxes point this at an
+    # artifact from `python -m algorithm.export`, e.g. models/best_model.int8-static.pt
+    # (the server swaps in whatever lands at this path, so re-export after training)
+    INFERENCE_MODEL_PATH = MODEL_PATH
     DEVICE = "mps" if torch.backends.mps.is_available() else "cpu"
     
     bootstrap_model(MODEL_PATH)
     
+    num_workers = 8
+    games_per_process = 1 # Concurrent games per worker; >1 batches leaves across games
+
+    # One request slot range per worker, one channel per search thread
+    transport = SharedTransport(num_workers, slots_per_client=64, channels_per_client=16)
+
     with mp.Manager() as manager:
         shared_stats = manager.dict()
-        result_dict = manager.dict() # Stores (probs, value) keyed by request_id
-        task_queue = mp.Queue(maxsize=256)
         processes = []
 
         # 1. Start Inference Server (The GPU master)
         inf_p = mp.Process(
             target=inference_worker, 
-            args=(MODEL_PATH, DEVICE, task_queue, result_dict)
+            args=(INFERENCE_MODEL_PATH, DEVICE, transport, shared_stats) # Publishes batching stats for the dashboard
         )
         inf_p.start()
         processes.append(inf_p)
@@ -87,11 +109,10 @@ if __name__ == "__main__":
         processes.append(dashboard_p)
 
         # 3. Start Workers
-        num_workers = 8
         for i in range(num_workers):
             p = mp.Process(
                 target=worker_task, 
-                args=(i, MODEL_PATH, shared_stats, task_queue, result_dict)
+                args=(i, shared_stats, transport, games_per_process)
             )
             p.start()
             processes.append(p)
@@ -99,4 +120,6 @@ if __name__ == "__main__":
         try:
             for p in processes: p.join()
         except KeyboardInterrupt:
-            for p in processes: p.terminate()
\ No newline at end of file
+            for p in processes: p.terminate()
+        finally:
+            transport.close()
\ No newline at end of file
@@ -10,65 +10,156 @@ import subprocess
 import sys
 from torch.utils.data import Dataset, DataLoader
 from algorithm.model import AlphaNet
+from algorithm.encoder import AlphaZeroEncoder
+from algorithm.replay import load_samples
+from algorithm.checkpoints import load_checkpoint, save_checkpoint
+
+REPLAY_BUFFER_SIZE = 500000 # Samples in the training window (hyperparameters.txt)
+
+def policy_loss(logits, pi_idx, pi_prob):
+    """
+    Cross-entropy against sparse targets: -sum(p * log_softmax) over the
+    stored moves only, the same value as CrossEntropyLoss on dense targets.
+    """
+    log_p = torch.log_softmax(logits, dim=1)
+    return -(pi_prob * log_p.gather(1, pi_idx)).sum(dim=1).mean()
 
 class ChessDataset(Dataset):
-    def __init__(self, buffer_path, max_samples=100000):
+    """
+    Replay window kept in the packed format: ~200 B of bitboards and ~400 B
+    of sparse policy per position instead of 22 KB of planes and dense
+    targets. Items are indices; collate() expands a whole batch to planes
+    with one vectorized unpack.
+
+    The window is a ring of max_samples preallocated on the first load:
+    refresh_files() only reads files it hasn't seen, oldest first, and
+    overwrites the oldest samples, so a refresh costs O(new data) and the
+    footprint never changes.
+    """
+    FIELDS = ("bitboards", "castling", "halfmove", "pi_idx", "pi_prob", "zs", "model_versions")
+
+    def __init__(self, buffer_path, max_samples=REPLAY_BUFFER_SIZE):
         self.buffer_path = os.path.abspath(buffer_path)
         self.max_samples = max_samples
-        self.file_list = []
+        self.encoder = AlphaZeroEncoder(history_len=2)
+        self._seen = set() # Files already in the ring (or evicted from it)
+        self._head = 0 # Next slot to overwrite
+        self._size = 0
+        self.ingested = 0
+        self.ingest_rate = 0.0 # Samples/s of the last refresh that found new files
         self.refresh_files()
 
     def refresh_files(self):
+        """Ingests new replay files; returns the number of samples added."""
         if not os.path.exists(self.buffer_path):
-            return
-        all_files = sorted(glob.glob(os.path.join(self.buffer_path, "*.npz")), 
-                          key=os.path.getmtime, reverse=True)
-        
-        self.file_list = all_files[:200]
-        
-        self.states, self.pis, self.zs = [], [], []
-        total_samples = 0
-        for f in self.file_list:
+            return 0
+        start = time.time()
+        files = set(glob.glob(os.path.join(self.buffer_path, "*.npz")))
+        self._seen &= files # Forget deleted files so the set doesn't grow forever
+        new = sorted(files - self._seen, key=os.path.getmtime, reverse=True)
+
+        # Newest first until the ring is full; anything older would be evicted right away
+        loaded, total = [], 0
+        for f in new:
+            if total >= self.max_samples:
+                self._seen.add(f)
+                continue
             try:
-                with np.load(f) as data:
-                    self.states.append(data['states'])
-                    self.pis.append(data['pis'])
-                    self.zs.append(data['zs'])
-                    total_samples += len(data['zs'])
-                if total_samples >= self.max_samples: break
-            except: continue
-            
-        if self.states:
-            self.states = np.concatenate(self.states, axis=0)
-            self.pis = np.concatenate(self.pis, axis=0)
-            self.zs = np.concatenate(self.zs, axis=0)
+                samples = load_samples(f) # Legacy files are packed and sparsified on load
+            except Exception:
+                continue # Retried on the next refresh
+            self._seen.add(f)
+            loaded.append(samples)
+            total += len(samples["zs"])
+
+        for samples in reversed(loaded):
+            self._append(samples)
+        if total:
+            self.ingested += total
+            self.ingest_rate = total / max(time.time() - start, 1e-6)
+        return total
+
+    def _append(self, samples):
+        n = len(samples["zs"])
+        if n > self.max_samples:
+            samples = {k: samples[k][-self.max_samples:] for k in self.FIELDS}
+            n = self.max_samples
+        if not hasattr(self, "zs"):
+            for k in self.FIELDS:
+                setattr(self, k, np.zeros((self.max_samples,) + samples[k].shape[1:], dtype=samples[k].dtype))
+
+        # Copy in at most two pieces around the end of the ring
+        first = min(n, self.max_samples - self._head)
+        for k in self.FIELDS:
+            ring, data = getattr(self, k), samples[k]
+            ring[self._head:self._head + first] = data[:first]
+            ring[:n - first] = data[first:]
+        self._head = (self._head + n) % self.max_samples
+        self._size = min(self._size + n, self.max_samples)
+
+    def fill(self):
+        return self._size / self.max_samples
+
+    def nbytes(self):
+        if not hasattr(self, "zs"):
+            return 0
+        return sum(getattr(self, k).nbytes for k in self.FIELDS)
 
     def __len__(self):
-        return len(self.zs) if hasattr(self, 'zs') else 0
+        return self._size
 
     def __getitem__(self, idx):
+        return idx
+
+    def collate(self, indices):
+        idx = np.asarray(indices)
+        states = self.encoder.unpack_batch(self.bitboards[idx], self.castling[idx], self.halfmove[idx])
         return (
-            torch.from_numpy(self.states[idx]).float(),
-            torch.from_numpy(self.pis[idx]).float(),
-            torch.tensor(self.zs[idx]).float()
+            torch.from_numpy(states),
+            torch.from_numpy(self.pi_idx[idx].astype(np.int64)),
+            torch.from_numpy(self.pi_prob[idx]),
+            torch.from_numpy(self.zs[idx])
         )
 
 class AlphaTrainer:
-    def __init__(self, model_path, buffer_path, device="cpu", dashboard_url="http://localhost:5005"):
+    """
+    fast=True trains under torch.autocast (bfloat16, or float16 with loss
+    scaling on GPUs without it) with channels-last activations; compile=True also
+    runs the net through torch.compile. accum_steps > 1 accumulates
+    gradients over that many batches per optimizer step. Weights stay
+    fp32 either way, and so do the saved checkpoints.
+    """
+    def __init__(self, model_path, buffer_path, device="cpu", dashboard_url="http://localhost:5005",
+                 fast=False, compile=False, accum_steps=1):
         self.model_path = os.path.abspath(model_path)
         self.buffer_path = buffer_path
         self.device = device
         self.dashboard_url = dashboard_url
         self.dataset = ChessDataset(self.buffer_path)
+        self.fast = fast
+        self.accum_steps = max(1, accum_steps)
         
         self.model = AlphaNet(num_res_blocks=10, channels=128).to(self.device)
+        self.version = 0 # Bumped on every publish; the inference server swaps to each new one
         if os.path.exists(self.model_path):
-            print(f"[*] Reloading Weights: {os.path.basename(self.model_path)}")
-            self.model.load_state_dict(torch.load(self.model_path, map_location=self.device))
+            state_dict, self.version = load_checkpoint(self.model_path, map_location=self.device)
+            print(f"[*] Reloading Weights: {os.path.basename(self.model_path)} (v{self.version})")
+            self.model.load_state_dict(state_dict)
+
+        # Fast path: bf16/fp16 compute, channels-last convs, optionally compiled
+        device_type = torch.device(self.device).type
+        self.amp_dtype = None
+        if fast:
+            self.amp_dtype = torch.bfloat16
+            if device_type == "cuda" and not torch.cuda.is_bf16_supported():
+                self.amp_dtype = torch.float16 # Older GPUs: needs the loss scaler below
+            self.model = self.model.to(memory_format=torch.channels_last)
+        self.scaler = torch.amp.GradScaler(device_type, enabled=self.amp_dtype == torch.float16)
+        # Shares its parameters with self.model, whose state_dict keeps the plain key names
+        self.train_model = torch.compile(self.model) if compile else self.model
         
         self.optimizer = optim.AdamW(self.model.parameters(), lr=0.001, weight_decay=1e-4)
         self.mse_loss = nn.MSELoss()
-        self.ce_loss = nn.CrossEntropyLoss()
 
     def report_metrics(self, p_loss, v_loss):
         try:
@@ -76,7 +167,9 @@ class AlphaTrainer:
                 "p_loss": float(p_loss),
                 "v_loss": float(v_loss),
                 "lr": self.optimizer.param_groups[0]['lr'],
-                "buffer_size": len(self.dataset)
+                "buffer_size": len(self.dataset),
+                "buffer_fill": round(self.dataset.fill(), 4),
+                "ingest_rate": round(self.dataset.ingest_rate, 1)
             }
             requests.post(f"{self.dashboard_url}/api/update", json=payload, timeout=0.5)
         except:
@@ -84,7 +177,7 @@ class AlphaTrainer:
 
     def train_step(self, batch_size=1024, epochs=3):
         start_load = time.time()
-        self.dataset.refresh_files()
+        added = self.dataset.refresh_files()
         
         if len(self.dataset) < 2000:
             print(f" [!] Buffer: {len(self.dataset)}/2000 | Awaiting data...")
@@ -95,40 +188,80 @@ class AlphaTrainer:
             batch_size=batch_size, 
             shuffle=True, 
             num_workers=0, 
+            collate_fn=self.dataset.collate,
             pin_memory=True if self.device != "cpu" else False
         )
         
-        print(f"\n{'-'*50}\n ENGINE UPDATE | Samples: {len(self.dataset)} | Load Time: {time.time()-start_load:.2f}s")
-        self.model.train()
+        mode = f"{str(self.amp_dtype).replace('torch.', '')}, channels-last" if self.fast else "fp32"
+        print(f"\n{'-'*50}\n ENGINE UPDATE | Samples: {len(self.dataset)} ({self.dataset.fill():.1%} of {self.dataset.nbytes() / 1e6:.0f} MB)"
+              f" | +{added} in {time.time()-start_load:.2f}s ({self.dataset.ingest_rate:.0f}/s)"
+              f" | {mode}, batch {batch_size} x {self.accum_steps}")
+        self.train_model.train()
 
         for epoch in range(epochs):
             p_losses, v_losses = [], []
+            timings = dict.fromkeys(("data", "forward", "backward", "optimizer"), 0.0)
             epoch_start = time.time()
-            
-            for states, pis, zs in loader:
-                states, pis, zs = states.to(self.device), pis.to(self.device), zs.to(self.device)
-                
-                self.optimizer.zero_grad()
-                p_logits, v = self.model(states)
-                v = v.view(-1)
-                
-                loss_v = self.mse_loss(v, zs)
-                loss_p = self.ce_loss(p_logits, pis)
-                
-                (loss_v + loss_p).backward()
-                self.optimizer.step()
+            self.optimizer.zero_grad()
+
+            tick = time.time()
+            for i, (states, pi_idx, pi_prob, zs) in enumerate(loader):
+                if self.fast:
+                    states = states.contiguous(memory_format=torch.channels_last)
+                states, zs = states.to(self.device, non_blocking=True), zs.to(self.device, non_blocking=True)
+                pi_idx, pi_prob = pi_idx.to(self.device), pi_prob.to(self.device)
+                tick = self._lap(timings, "data", tick)
+
+                with torch.autocast(torch.device(self.device).type, dtype=self.amp_dtype, enabled=self.fast):
+                    p_logits, v = self.train_model(states)
+                # Losses in fp32 whatever the net ran in
+                loss_v = self.mse_loss(v.float().view(-1), zs)
+                loss_p = policy_loss(p_logits.float(), pi_idx, pi_prob)
+                tick = self._lap(timings, "forward", tick)
+
+                # Average over the batches of this optimizer step; the last group may be short
+                group = min(self.accum_steps, len(loader) - i // self.accum_steps * self.accum_steps)
+                self.scaler.scale((loss_v + loss_p) / group).backward()
+                tick = self._lap(timings, "backward", tick)
+
+                if (i + 1) % self.accum_steps == 0 or i + 1 == len(loader):
+                    self.scaler.step(self.optimizer)
+                    self.scaler.update()
+                    self.optimizer.zero_grad()
+                    tick = self._lap(timings, "optimizer", tick)
                 
                 p_losses.append(loss_p.item())
                 v_losses.append(loss_v.item())
+                tick = time.time()
 
             avg_p, avg_v = np.mean(p_losses), np.mean(v_losses)
-            print(f" > Epoch {epoch+1}/{epochs} | Policy: {avg_p:.4f} | Value: {avg_v:.4f} | {time.time()-epoch_start:.1f}s")
+            elapsed = time.time() - epoch_start
+            print(f" > Epoch {epoch+1}/{epochs} | Policy: {avg_p:.4f} | Value: {avg_v:.4f} | {elapsed:.1f}s"
+                  f" ({len(self.dataset) / elapsed:.0f} samples/s)")
+            print("   " + " | ".join(f"{k} {v:.1f}s" for k, v in timings.items()))
             self.report_metrics(avg_p, avg_v)
         
-        torch.save(self.model.state_dict(), self.model_path)
-        print(f"[*] Weights Synchronized. {'-'*31}")
+        # Atomic replace: the inference server's watcher never reads a partial checkpoint
+        self.version += 1
+        save_checkpoint(self.checkpoint_state(), self.model_path, self.version)
+        print(f"[*] Weights Synchronized (v{self.version}). {'-'*26}")
         return True
 
+    def checkpoint_state(self):
+        # Plain fp32, contiguous CPU tensors under the uncompiled key names, whatever the training mode
+        return {k: (v.float() if v.is_floating_point() else v).detach().cpu().contiguous()
+                for k, v in self.model.state_dict().items()}
+
+    def _lap(self, timings, phase, tick):
+        # Device work is asynchronous off the CPU; wait for it so each phase gets its own time
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        elif self.device == "mps":
+            torch.mps.synchronize()
+        now = time.time()
+        timings[phase] += now - tick
+        return now
+
 if __name__ == "__main__":
     # Resolve Paths based on your screenshot structure
     script_dir = os.path.dirname(os.path.abspath(__file__)) # groundzero/alphazero/
@@ -140,16 +273,24 @@ if __name__ == "__main__":
 
     DEVICE = "mps" if torch.backends.mps.is_available() else "cpu"
 
+    import argparse
+    parser = argparse.ArgumentParser(description="AlphaZero trainer")
+    parser.add_argument("--fast", action="store_true", help="Mixed precision (bf16 on CPU) and channels-last")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the net")
+    parser.add_argument("--accum-steps", type=int, default=1, help="Batches per optimizer step")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    args = parser.parse_args()
+
     # Launch Dashboard Process
     print(f"[*] Starting Dashboard from: {DASHBOARD_SCRIPT}")
     dashboard_proc = subprocess.Popen([sys.executable, DASHBOARD_SCRIPT])
 
     try:
-        trainer = AlphaTrainer(MODEL_PATH, BUFFER_PATH, DEVICE)
+        trainer = AlphaTrainer(MODEL_PATH, BUFFER_PATH, DEVICE, fast=args.fast, compile=args.compile, accum_steps=args.accum_steps)
         print(f"[*] AlphaZero Trainer Active [{DEVICE}]")
 
         while True:
-            if trainer.train_step():
+            if trainer.train_step(batch_size=args.batch_size):
                 time.sleep(30)
             else:
                 time.sleep(10)
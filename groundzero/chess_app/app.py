@@ -1,4 +1,6 @@
-import sys, os, chess, time, torch
+import sys, os, chess, time, torch, threading
+from functools import partial
+import numpy as np
 from flask import Flask, request, jsonify, render_template
 
 # --- ROBUST PATH SETUP ---
@@ -14,8 +16,10 @@ if inner_gz_dir not in sys.path:
     sys.path.insert(0, inner_gz_dir)
 
 from mcts.search import MCTS
+from mcts.parallel import RootParallelSearch
 from mcts.evaluator import MaterialEvaluator 
 from groundzero.alphazero.algorithm.evaluator import AlphaZeroEvaluator 
+from groundzero.alphazero.algorithm.checkpoints import file_stamp
 
 app = Flask(__name__)
 
@@ -23,6 +27,15 @@ app = Flask(__name__)
 device = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
 
 MODEL_PATH = os.path.join(project_root, "models", "best_model.pth")
+# On CPU, use an exported artifact (python -m algorithm.export) when there is
+# one, unless the checkpoint has been trained further since it was exported
+CPU_MODEL_PATH = os.path.join(project_root, "models", "best_model.fp32.pt")
+if device == "cpu":
+    artifact, checkpoint = file_stamp(CPU_MODEL_PATH), file_stamp(MODEL_PATH)
+    if artifact is not None and (checkpoint is None or artifact[0] >= checkpoint[0]):
+        MODEL_PATH = CPU_MODEL_PATH
+    elif artifact is not None:
+        print(f"Ignoring {os.path.basename(CPU_MODEL_PATH)}: older than the checkpoint, re-export it")
 
 print(f"\n--- Engine Startup ---")
 print(f"Project Root: {project_root}")
@@ -36,10 +49,32 @@ else:
 evaluator = AlphaZeroEvaluator(model_path=MODEL_PATH, device=device) 
 engine = MCTS(evaluator)
 print(f"Engine Ready.\n")
+
+# Root-parallel search: >1 runs engine moves on that many CPU processes, each
+# with its own tree and model copy, merged at the root (no pondering then)
+ROOT_PARALLEL_WORKERS = 0
+parallel_engine = None
+
+def search_engine():
+    """The engine used for engine moves; the worker pool starts on first use."""
+    global parallel_engine
+    if ROOT_PARALLEL_WORKERS <= 1:
+        return engine
+    if parallel_engine is None:
+        factory = partial(AlphaZeroEvaluator, model_path=MODEL_PATH, device="cpu")
+        parallel_engine = RootParallelSearch(factory, num_workers=ROOT_PARALLEL_WORKERS, params=engine.params) # Forces batched workers
+    return parallel_engine
 # -------------------------------------
 
 GLOBAL_BOARD = chess.Board()
 
+# --- Search tree kept between requests ---
+# "root" is the tree for the position reached by "moves"; after each engine
+# move a background search ponders the predicted human reply inside it.
+ENGINE = {"root": None, "moves": [], "ponder": None}
+ENGINE_LOCK = threading.Lock()
+PONDER_MAX_NODES = 20000 # Caps tree growth if the human takes a long time
+
 STATE = {
     "move_times": [],
     "history_evals": [0.5], 
@@ -86,32 +121,105 @@ def make_move():
     data = request.get_json(force=True)
     return process_move(data.get("uci", ""))
 
+def stop_ponder():
+    ponder = ENGINE["ponder"]
+    if ponder is not None:
+        ponder["stop"].set()
+        ponder["thread"].join()
+        ENGINE["ponder"] = None
+
+def reuse_subtree(board):
+    """Returns the kept tree for `board`, descending through moves played since, or None."""
+    root, moves = ENGINE["root"], ENGINE["moves"]
+    stack = board.move_stack
+    if root is None or stack[:len(moves)] != moves:
+        return None
+    for mv in stack[len(moves):]:
+        root = root.child(mv)
+        if root is None:
+            return None
+    return root
+
+def start_ponder(board, root):
+    """Keeps `root` as the tree for `board` and searches the most likely reply in the background."""
+    ENGINE["root"], ENGINE["moves"] = root, list(board.move_stack)
+    if root is None or root.total_n == 0 or board.is_game_over():
+        return
+
+    slot = int(np.argmax(root.N))
+    ponder_board = board.copy()
+    ponder_board.push(root.move(slot))
+    if ponder_board.is_game_over():
+        return
+
+    stop = threading.Event()
+    def ponder():
+        _, _, subtree = engine.search(ponder_board, root=root.children.get(slot),
+                                      max_nodes=PONDER_MAX_NODES, stop_event=stop)
+        root.children[slot] = subtree # Hook a freshly built subtree into the kept tree
+
+    thread = threading.Thread(target=ponder, daemon=True)
+    thread.start()
+    ENGINE["ponder"] = {"thread": thread, "stop": stop}
+
 @app.post("/engine_move")
 def engine_move():
     if GLOBAL_BOARD.is_game_over():
         return jsonify({"ok": False}), 400
+
+    with ENGINE_LOCK:
+        return _engine_move()
+
+def _engine_move():
+    stop_ponder()
+    root = reuse_subtree(GLOBAL_BOARD)
+    inherited = int(root.total_n) if root is not None else 0
+    search_stack = list(GLOBAL_BOARD.move_stack)
     
     # FIX: search.py returns (best_move, pi_dist, root)
-    best_move, pi_dist, root = engine.search(GLOBAL_BOARD)
+    searcher = search_engine()
+    best_move, pi_dist, root = searcher.search(GLOBAL_BOARD, root=root)
+    # Root-parallel workers keep their own trees and report what they reused
+    inherited = int(searcher.latest_stats.get("inherited_visits", inherited))
     
     # Calculate stats from the root node
-    total_n = sum(root.N.values())
+    total_n = root.total_n
     # Q values in MCTS are usually -1 to 1. We convert to 0-100% win prob.
     # We look at the Q value of the move we chose.
-    chosen_q = root.Q.get(best_move, 0.0)
+    slot = root.index(best_move)
+    chosen_q = root.Q[slot] if slot >= 0 else 0.0
     win_prob = (chosen_q + 1) / 2 * 100 
 
     stats = {
         "win_prob": round(float(win_prob), 1),
         "simulations": int(total_n),
-        "depth": int(engine.latest_depth),
-        "top_lines": [] 
+        "simulations_spent": int(searcher.latest_stats.get("simulations", 0)),
+        "inherited_visits": inherited,
+        "stop_reason": searcher.latest_stats.get("stop_reason"),
+        "tree_nodes": int(searcher.latest_stats.get("nodes", 0)),
+        "tree_mb": searcher.latest_stats.get("tree_mb", 0.0),
+        "depth": int(searcher.latest_depth),
+        "top_lines": top_lines(GLOBAL_BOARD, root)
     }
     
     STATE["last_stats"] = stats
-    return process_move(best_move.uci(), 
-                        engine_eval=stats["win_prob"] / 100.0, 
-                        engine_depth=stats["depth"])
+    res = process_move(best_move.uci(), 
+                       engine_eval=stats["win_prob"] / 100.0, 
+                       engine_depth=stats["depth"])
+
+    # Ponder only if the board really continued from the searched position
+    if GLOBAL_BOARD.move_stack == search_stack + [best_move]:
+        start_ponder(GLOBAL_BOARD, root.child(best_move))
+    else:
+        ENGINE["root"], ENGINE["moves"] = None, []
+    return res
+
+def top_lines(board, root, count=3):
+    """Most visited root moves with their Q, for the analysis panel."""
+    q = root.Q
+    order = np.argsort(-root.N)[:count]
+    return [{"line": board.san(root.move(int(i))), "q": float(q[i]), "visits": int(root.N[i])}
+            for i in order if root.N[i] > 0]
 
 def process_move(uci, engine_eval=None, engine_depth=None):
     try:
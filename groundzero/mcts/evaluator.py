@@ -1,4 +1,5 @@
 import chess
+import numpy as np
 
 # Piece-Square Tables (PST)
 # Values represent the bonus/penalty for a piece being on a specific square.
@@ -47,64 +48,79 @@ PST = {
     ]
 }
 
+# Material + PST score of each (piece, square), signed for White, laid out
+# as 12 rows (White pawn..king, then Black) of 64 squares. Black reads the
+# White tables through the vertical flip square ^ 56.
+_PIECE_VALUES = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 20000
+}
+
+def _score_table():
+    table = np.zeros((2, 6, 64), dtype=np.int64)
+    for pt in chess.PIECE_TYPES:
+        pst = np.array(PST.get(pt, [0] * 64), dtype=np.int64)
+        table[0, pt - 1] = _PIECE_VALUES[pt] + pst
+        table[1, pt - 1] = -(_PIECE_VALUES[pt] + pst[np.arange(64) ^ 56])
+    return table.reshape(-1)
+
+_SCORE_TABLE = _score_table()
+
+def _piece_masks(board):
+    """The 12 piece bitboards of `board` in _SCORE_TABLE row order."""
+    black, white = board.occupied_co # Indexed by color, chess.BLACK == 0
+    types = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+    return [m & white for m in types] + [m & black for m in types]
+
 class MaterialEvaluator:
+    """
+    Material + piece-square tables + mobility. Scores come from the piece
+    bitboards: all 12 are unpacked to bits in one NumPy call and dotted with
+    a precomputed (piece, square) table, so there is no loop over squares.
+    """
     def __init__(self):
-        self.piece_values = {
-            chess.PAWN: 100,
-            chess.KNIGHT: 320,
-            chess.BISHOP: 330,
-            chess.ROOK: 500,
-            chess.QUEEN: 900,
-            chess.KING: 20000
-        }
+        self.piece_values = dict(_PIECE_VALUES)
 
     def evaluate(self, board: chess.Board):
+        return self.evaluate_batch([board])[0]
+
+    def evaluate_batch(self, boards):
+        """Evaluates many boards with one unpack + matrix-vector product for all of them."""
         # 1. Policy (Priors)
         # For transparency, we could eventually weight this by moves that 
         # lead to better board states, but for pure MCTS we use uniform priors.
-        legal_moves = list(board.legal_moves)
-        if not legal_moves:
-            return {}, 0
-        priors = {mv: 1.0 / len(legal_moves) for mv in legal_moves}
+        legal = [list(board.legal_moves) for board in boards]
 
         # 2. Positional Value
-        if board.is_checkmate():
-            # If it's currently our turn and we are in checkmate, value is -1
-            return priors, -1.0
-        
-        score = 0
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if not piece:
+        masks = np.array([_piece_masks(board) for board in boards], dtype=np.uint64)
+        bits = np.unpackbits(masks.view(np.uint8), bitorder="little").reshape(len(boards), -1)
+        scores = bits @ _SCORE_TABLE
+
+        results = []
+        for board, legal_moves, score in zip(boards, legal, scores.tolist()):
+            if not legal_moves:
+                results.append(({}, 0))
                 continue
-            
-            # Material value
-            val = self.piece_values.get(piece.piece_type, 0)
-            
-            # PST value
-            pst_val = 0
-            if piece.piece_type in PST:
-                # If black, flip the square index to use the same table
-                idx = square if piece.color == chess.WHITE else chess.SQUARE_NAMES.index(chess.square_name(square ^ 56))
-                pst_val = PST[piece.piece_type][idx]
-            
-            total_val = val + pst_val
-            if piece.color == chess.WHITE:
-                score += total_val
-            else:
-                score -= total_val
-        
-        # Mobility Bonus: reward having more options
-        mobility = board.legal_moves.count()
-        score += (mobility * 10) if board.turn == chess.WHITE else -(mobility * 10)
+            priors = dict.fromkeys(legal_moves, 1.0 / len(legal_moves))
+
+            # Mobility Bonus: reward having more options
+            mobility = len(legal_moves)
+            score += (mobility * 10) if board.turn == chess.WHITE else -(mobility * 10)
+
+            # Normalize to [-1, 1]
+            # A 1000 point lead (approx. one Queen) is mapped to 0.8 win prob
+            value = max(-1.0, min(1.0, score / 1200.0))
+
+            # Adjust for Point of View (Side to move)
+            # MCTS expects value relative to the player whose turn it is
+            if not board.turn:
+                value = -value
+            results.append((priors, value))
+        return results
 
-        # Normalize to [-1, 1]
-        # A 1000 point lead (approx. one Queen) is mapped to 0.8 win prob
-        value = max(-1.0, min(1.0, score / 1200.0))
-        
-        # Adjust for Point of View (Side to move)
-        # MCTS expects value relative to the player whose turn it is
-        if not board.turn:
-            value = -value
-            
-        return priors, value
\ No newline at end of file
+    async def evaluate_async(self, board: chess.Board):
+        return self.evaluate(board)
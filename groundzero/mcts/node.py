@@ -1,20 +1,124 @@
 import chess
+import numpy as np
+
+# Measured footprint of one node: the object, its children dict and four
+# array headers, plus 14 B per legal move (uint16 move, float32 P/N/W)
+_NODE_BYTES = 630
+_BYTES_PER_MOVE = 14
+
+def node_bytes(num_moves):
+    """Approximate memory held by a node with `num_moves` legal moves."""
+    return _NODE_BYTES + _BYTES_PER_MOVE * num_moves
 
 class MCTSNode:
-    def __init__(self, priors: dict):
+    """
+    Compact search node. Statistics for the moves LEAVING this node are kept
+    in parallel NumPy arrays indexed by move slot, so selection is a single
+    vectorized PUCT argmax instead of a Python loop over per-move dicts.
+    """
+    __slots__ = ("moves", "P", "N", "W", "total_n", "total_w", "children", "value", "terminal", "proven", "lost")
+
+    def __init__(self, priors: dict, value=0.0, terminal=False):
         """
         priors: dict of {chess.Move: probability} for moves available at this state.
+        value: evaluator value of this state, relative to the side to move.
+        terminal: True if the game is over here; value is then the exact result.
         """
-        self.children = {} # Maps move -> child MCTSNode
-        
-        # Statistics for moves LEAVING this node
-        self.N = {} # Visit count
-        self.W = {} # Total value
-        self.Q = {} # Mean value
-        self.P = {} # Prior probability
-
-        for mv, prob in priors.items():
-            self.N[mv] = 0
-            self.W[mv] = 0.0
-            self.Q[mv] = 0.0
-            self.P[mv] = prob
\ No newline at end of file
+        n = len(priors)
+        # Moves packed as from | to << 6 | promotion << 12
+        self.moves = np.fromiter(
+            (mv.from_square | (mv.to_square << 6) | ((mv.promotion or 0) << 12) for mv in priors),
+            dtype=np.uint16, count=n
+        )
+        self.P = np.fromiter(priors.values(), dtype=np.float32, count=n) # Prior probability
+        self.N = np.zeros(n, dtype=np.float32) # Visit count (includes in-flight virtual loss)
+        self.W = np.zeros(n, dtype=np.float32) # Total value, for the side to move here
+
+        # Running sums of N and W, kept in step with every update
+        self.total_n = 0.0
+        self.total_w = 0.0
+
+        self.children = {} # Maps move slot -> child MCTSNode
+        self.value = value
+        self.terminal = terminal
+
+        # MCTS-solver: exact result for the side to move once the subtree
+        # settles it (1 win, -1 loss, 0 draw), and a mask of moves proven lost
+        self.proven = value if terminal else None
+        self.lost = None # Created on the first lost move
+
+    def move(self, slot):
+        code = int(self.moves[slot])
+        return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+    def index(self, move: chess.Move):
+        """Slot of `move` in this node, or -1 if it is not a legal move here."""
+        code = move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+        hits = np.flatnonzero(self.moves == code)
+        return int(hits[0]) if len(hits) else -1
+
+    def child(self, move: chess.Move):
+        slot = self.index(move)
+        return self.children.get(slot) if slot >= 0 else None
+
+    @property
+    def Q(self):
+        """Mean value per move (0 for unvisited moves)."""
+        return np.divide(self.W, self.N, out=np.zeros_like(self.W), where=self.N > 0)
+
+    def mean_value(self):
+        """Value of this state for the side to move, averaging its own evaluation with its subtree."""
+        if self.proven is not None:
+            return self.proven
+        return (self.value + self.total_w) / (1 + self.total_n)
+
+
+class NodePool:
+    """
+    Allocates the nodes of one search tree and keeps count of how many are
+    alive and how much memory they hold, against a cap of max_mb. Nodes are
+    never freed one at a time: when the root moves on, reroot() recounts the
+    surviving subtree and everything else is left to the garbage collector.
+    """
+    def __init__(self, max_mb=1024):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.root = None
+        self.nodes = 0
+        self.bytes_used = 0
+
+    def new_node(self, priors, value=0.0, terminal=False):
+        node = MCTSNode(priors, value, terminal)
+        self.nodes += 1
+        self.bytes_used += node_bytes(len(priors))
+        return node
+
+    def full(self):
+        return self.bytes_used >= self.max_bytes
+
+    def reroot(self, root, min_visits=0):
+        """
+        Makes `root` the tree this pool accounts for. Children reached through
+        an edge with fewer than min_visits visits are cut off (the edge keeps
+        its statistics and is re-expanded on its next visit); proven children
+        are kept since the solver's results live on them. Returns the ids of
+        the nodes still in the tree.
+        """
+        self.root = root
+        self.nodes = self.bytes_used = 0
+        live = set()
+        stack = [root] if root is not None else []
+        while stack:
+            node = stack.pop()
+            if id(node) in live:
+                continue # Shared through a transposition
+            live.add(id(node))
+            self.nodes += 1
+            self.bytes_used += node_bytes(len(node.moves))
+            if min_visits > 0:
+                for slot in [s for s, c in node.children.items() if node.N[s] < min_visits and c.proven is None]:
+                    del node.children[slot]
+            stack.extend(node.children.values())
+        return live
+
+    def stats(self):
+        return {"nodes": self.nodes, "tree_mb": round(self.bytes_used / (1024 * 1024), 2)}
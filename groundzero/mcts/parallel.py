@@ -0,0 +1,190 @@
+import sys
+import math
+import chess
+import numpy as np
+import multiprocessing as mp
+from collections import Counter
+from .node import MCTSNode
+from .search import MCTS
+
+class RootParallelSearch:
+    """
+    Root parallelism: num_workers processes each grow their own tree for the
+    same position, and the root visit counts and values are summed at the
+    end. The trees never share a lock or the GIL, so simulations/sec scales
+    with the cores available. Every worker builds its evaluator with
+    evaluator_factory(), which must be picklable (e.g. a class or a
+    functools.partial); point it at the inference server to share one model.
+
+    search() has the same signature and return value as MCTS.search(), but
+    the returned root is a merged summary without children.
+    """
+    def __init__(self, evaluator_factory, num_workers=4, params=None, noise_eps=0.1, threads_per_worker=1):
+        self.num_workers = num_workers
+        self.params = {'SIMULATIONS': MCTS(None).params['SIMULATIONS']}
+        self.params.update(params or {})
+        # Workers are single-threaded and batch their own leaves, whatever the caller's engine does
+        self.params['SEARCH_MODE'] = 'batched'
+        self.latest_depth = 0
+        self.latest_stats = {}
+
+        ctx = mp.get_context("spawn") # Safe next to threads and torch
+        self._conns, self._procs = [], []
+        for i in range(num_workers):
+            parent, child = ctx.Pipe()
+            # Worker 0 searches as given; the others add a little root noise
+            # so the trees explore differently instead of duplicating work
+            worker_params = dict(self.params, EPS=noise_eps) if i > 0 else self.params
+            p = ctx.Process(target=_worker_loop, args=(child, evaluator_factory, worker_params, i, i > 0, threads_per_worker), daemon=True)
+            p.start()
+            self._conns.append(parent)
+            self._procs.append(p)
+
+    def search(self, board: chess.Board, is_training=False, root=None, max_time=None, max_nodes=None, stop_event=None):
+        """
+        Splits the node budget across the workers and merges their roots.
+        `root` is ignored: each worker keeps and reuses its own tree as long
+        as the new position continues the previous one. stop_event is not
+        supported across processes.
+        """
+        if max_nodes is None and max_time is None:
+            max_nodes = int(self.params['SIMULATIONS'])
+        per_worker = math.ceil(max_nodes / self.num_workers) if max_nodes is not None else None
+
+        for conn in self._conns:
+            conn.send((board, is_training, max_time, per_worker))
+        replies = [conn.recv() for conn in self._conns]
+        for status, payload in replies:
+            if status == "error":
+                raise RuntimeError(f"Root-parallel worker failed: {payload}")
+        return self._merge([payload for _, payload in replies])
+
+    def _merge(self, results):
+        first = results[0]
+        root = MCTSNode({})
+        root.moves = first["moves"].copy()
+        root.P = first["P"].copy()
+        root.N = np.zeros(len(root.moves), dtype=np.float32)
+        root.W = np.zeros(len(root.moves), dtype=np.float32)
+        root.value = first["value"]
+        counts = np.zeros(len(root.moves), dtype=np.float64)
+        won = None # Counts of a worker that proved a win
+        lost = np.zeros(len(root.moves), dtype=bool)
+        index = {int(code): i for i, code in enumerate(root.moves)}
+
+        for res in results:
+            slots = np.array([index[int(code)] for code in res["moves"]], dtype=np.int64)
+            root.N[slots] += res["N"]
+            root.W[slots] += res["W"]
+            counts[slots] += res["counts"]
+            if res["lost"] is not None:
+                lost[slots] |= res["lost"]
+            if res["proven"] is not None and root.proven != 1.0:
+                root.proven = res["proven"]
+            if res["proven"] == 1.0 and won is None:
+                won = np.zeros(len(root.moves))
+                won[slots] = res["counts"]
+
+        if won is not None:
+            # A proof from one tree is exact: play its winning move (visits still count every tree)
+            counts = won
+        elif lost.any() and not lost.all():
+            counts[lost] = 0
+
+        root.lost = lost if lost.any() else None
+        root.total_n = float(root.N.sum())
+        root.total_w = float(root.W.sum())
+
+        stats = [res["stats"] for res in results]
+        self.latest_depth = max(res["depth"] for res in results)
+        self.latest_stats = {
+            "workers": self.num_workers,
+            "simulations": sum(s.get("simulations", 0) for s in stats),
+            "stop_reason": Counter(s.get("stop_reason") for s in stats).most_common(1)[0][0],
+            "sims_per_sec": round(sum(s.get("sims_per_sec", 0.0) for s in stats), 1),
+            "proven_nodes": sum(s.get("proven_nodes", 0) for s in stats),
+            "root_proven": root.proven,
+            "nodes": sum(s.get("nodes", 0) for s in stats),
+            "inherited_visits": sum(res["inherited"] for res in results),
+            "tree_mb": round(sum(s.get("tree_mb", 0.0) for s in stats), 2),
+        }
+
+        total = counts.sum()
+        if total == 0:
+            return root.move(0), {root.move(i): 1/len(root.P) for i in range(len(root.P))}, root
+        pi_dist = {root.move(i): float(n) / total for i, n in enumerate(counts)}
+        return root.move(int(np.argmax(counts))), pi_dist, root
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for p in self._procs:
+            p.join(timeout=5)
+        self._conns, self._procs = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _worker_loop(conn, evaluator_factory, params, seed, add_noise, threads):
+    np.random.seed(seed)
+    engine = MCTS(evaluator_factory())
+    engine.params.update(params)
+    if threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads) # Don't oversubscribe the cores
+
+    root, root_game = None, (None, [])
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            return
+        board, is_training, max_time, max_nodes = msg
+        game = (board.root().fen(), list(board.move_stack))
+        try:
+            root = _kept_subtree(root, root_game, game)
+            inherited = float(root.total_n) if root is not None else 0.0
+            _, _, root = engine.search(board, is_training=is_training or add_noise, root=root,
+                                       max_time=max_time, max_nodes=max_nodes)
+            root_game = game
+            conn.send(("ok", {
+                "moves": root.moves, "P": root.P, "N": root.N, "W": root.W,
+                "value": root.value, "proven": root.proven, "lost": root.lost,
+                "counts": engine._solved_counts(root),
+                "stats": engine.latest_stats, "depth": engine.latest_depth, "inherited": inherited,
+            }))
+        except Exception as e:
+            root, root_game = None, (None, [])
+            conn.send(("error", repr(e)))
+
+def _kept_subtree(root, root_game, game):
+    """
+    The worker's previous tree advanced to `game` (start FEN, moves), or None
+    if the new position does not continue the previous one.
+    """
+    (start, moves), (new_start, stack) = root_game, game
+    if root is None or start != new_start or stack[:len(moves)] != moves:
+        return None
+    for mv in stack[len(moves):]:
+        root = root.child(mv)
+        if root is None:
+            return None
+    return root
+
+if __name__ == "__main__":
+    # Quick scaling check with the material evaluator
+    import time
+    from .evaluator import MaterialEvaluator
+
+    board = chess.Board("r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2QKB1R w KQ - 0 8")
+    for workers in (1, 2, 4):
+        with RootParallelSearch(MaterialEvaluator, num_workers=workers, params={'EARLY_STOP': False}) as search:
+            search.search(chess.Board(), max_nodes=workers * 50) # Warm up the workers
+            start = time.time()
+            move, _, _ = search.search(board, max_nodes=8000)
+            elapsed = time.time() - start
+        print(f"{workers} workers: {board.san(move)} in {elapsed:.2f}s, {8000 / elapsed:.0f} sims/s")
@@ -0,0 +1,69 @@
+import time
+
+# select:   walking down the tree (PUCT + pushing moves on the board)
+# board:    restoring the board afterwards (pops) and copying leaf boards
+# terminal: game-over / repetition checks and transposition lookups at the leaf
+# eval:     waiting for the evaluator
+# expand:   attaching the new node
+# backup:   propagating the value up the path
+# lock_wait: waiting to acquire tree_lock (threaded mode)
+PHASES = ("select", "board", "terminal", "eval", "expand", "backup", "lock_wait")
+
+class SearchProfile:
+    """
+    Where one search, or a sum of searches, spent its time. Phase times are
+    seconds summed over simulation workers, so in threaded mode they can add
+    up to more than the wall time. Profiles add up with add(), e.g. to get
+    the totals for a whole game.
+    """
+    __slots__ = PHASES + ("searches", "simulations", "evals", "cache_hits", "tt_hits", "wall")
+
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def lap(self, phase, since):
+        """Charges the time since `since` to `phase` and returns the current time."""
+        now = time.perf_counter()
+        setattr(self, phase, getattr(self, phase) + now - since)
+        return now
+
+    def timed_lock(self, lock):
+        return _TimedLock(lock, self)
+
+    def add(self, other):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def as_dict(self):
+        stats = {f"{name}_ms": round(getattr(self, name) * 1000, 2) for name in PHASES}
+        stats.update({
+            "searches": self.searches,
+            "simulations": self.simulations,
+            "wall_ms": round(self.wall * 1000, 2),
+            "sims_per_sec": round(self.simulations / self.wall, 1) if self.wall > 0 else 0.0,
+            "evals": self.evals,
+            "cache_hits": self.cache_hits,
+            "tt_hits": self.tt_hits,
+        })
+        return stats
+
+class _TimedLock:
+    """Context manager around a lock that charges the wait to lock_wait."""
+    __slots__ = ("lock", "profile")
+
+    def __init__(self, lock, profile):
+        self.lock = lock
+        self.profile = profile
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        # Counted while holding the lock, so workers sharing a profile stay consistent
+        self.profile.lock_wait += time.perf_counter() - start
+
+    def __exit__(self, *exc):
+        self.lock.release()
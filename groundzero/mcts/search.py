@@ -1,11 +1,22 @@
 import math
 import chess
 import numpy as np
+import asyncio
 import time
 import threading
 import concurrent.futures
-from collections import Counter
-from .node import MCTSNode
+import chess.polyglot
+from collections import Counter, OrderedDict
+from .node import MCTSNode, NodePool
+from .profiling import SearchProfile
+
+# Plies of move history kept on leaf boards handed to the evaluator in batched
+# mode (the encoder's history planes need one)
+LEAF_HISTORY = 8
+
+# Game endings that depend only on the position, so they can be cached as nodes
+_POSITIONAL_ENDINGS = (chess.Termination.CHECKMATE, chess.Termination.STALEMATE,
+                       chess.Termination.INSUFFICIENT_MATERIAL)
 
 class MCTS:
     def __init__(self, evaluator):
@@ -16,130 +27,628 @@ class MCTS:
             'EPS': 0.3,         # Increased from 0.25 to give noise more weight
             'FPU_REDUCTION': 0.2,
             'VIRTUAL_LOSS': 3.0,
-            'PARALLEL_THREADS': 16 
+            'PARALLEL_THREADS': 16,
+            'SEARCH_MODE': 'threaded', # 'threaded', 'batched' (leaf-parallel) or 'async' (coroutines)
+            'BATCH_SIZE': 16,          # Leaves gathered per network call in batched mode
+            'ASYNC_INFLIGHT': 256,     # Concurrent simulation coroutines in async mode
+            'TRANSPOSITIONS': False,   # Share nodes between move orders reaching the same position
+            'TT_SIZE': 200000,         # Max positions kept in the transposition table (LRU)
+            'EARLY_STOP': True,        # Stop once the best root move can no longer be overtaken
+            'CONVERGENCE_EPS': 0.0,    # Also stop when the root policy moves less than this (L1); 0 = off
+            'CONVERGENCE_CHECK': 100,  # Simulations between convergence checks
+            'TREE_MEMORY_MB': 1024,    # Search stops expanding once the tree holds this much
+            'PRUNE_MIN_VISITS': 2,     # On a new root, drop subtrees behind edges visited less often
+            'PROFILE': True            # Time each search phase (latest_profile); False costs nothing
         }
         self.evaluator = evaluator
         self.c_puct = self.params['C_PUCT']
         self.v_loss = self.params['VIRTUAL_LOSS']
         self.latest_depth = 0
         self.latest_heatmap = {}
+        self.latest_stats = {}
+        self.latest_profile = None # SearchProfile of the last search when PROFILE is on
+        self.profile = None
         self.tree_lock = threading.Lock()
+        self.tt = OrderedDict() # Zobrist hash -> MCTSNode
+        self.pool = NodePool(self.params['TREE_MEMORY_MB'])
+
+    def search(self, board: chess.Board, is_training=False, root=None, max_time=None, max_nodes=None, stop_event=None):
+        """
+        Runs simulations from `board` and returns (best_move, pi_dist, root).
+        max_nodes caps simulations (default SIMULATIONS) and max_time caps
+        wall-clock seconds; with only max_time the node count is uncapped.
+        Setting stop_event (a threading.Event) from another thread ends the
+        search early, e.g. to cut a ponder search short.
+        """
+        forced = self._forced_move(board, root)
+        if forced is not None:
+            return forced
+
+        if root is None:
+            root = self._new_root(*self.evaluator.evaluate(board))
+        self._begin_search(board, is_training, root, max_time, max_nodes, stop_event)
+        num_threads = self.params['PARALLEL_THREADS']
+
+        if self.params['SEARCH_MODE'] == 'batched':
+            batches, evaluated = self._search_batched(board.copy(), root)
+        elif self.params['SEARCH_MODE'] == 'async':
+            batches, evaluated = asyncio.run(self._search_async(board, root))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+                futures = [executor.submit(self._simulation_worker, board, root) for _ in range(num_threads)]
+                for f in futures:
+                    f.result() # Surface simulation errors instead of silently dropping them
+            batches = evaluated = self._sims_done # One board per evaluator call
+
+        return self._finish_search(root, batches, evaluated)
+
+    async def search_async(self, board: chess.Board, is_training=False, root=None, max_time=None, max_nodes=None, stop_event=None):
+        """
+        Coroutine form of search() using the async driver. Several searches
+        (one MCTS per game) can run on the same event loop, and the
+        evaluator then batches the leaves of all of them together.
+        """
+        forced = self._forced_move(board, root)
+        if forced is not None:
+            return forced
 
-    def search(self, board: chess.Board, is_training=False, root=None):
-        self.evaluator.clear_cache()
-        
         if root is None:
-            priors, _ = self.evaluator.evaluate(board)
-            root = MCTSNode(priors)
+            root = self._new_root(*(await self.evaluator.evaluate_async(board)))
+        self._begin_search(board, is_training, root, max_time, max_nodes, stop_event)
+        batches, evaluated = await self._search_async(board, root)
+        return self._finish_search(root, batches, evaluated)
+
+    def _forced_move(self, board, root):
+        legal_moves = list(board.legal_moves)
+        if len(legal_moves) != 1:
+            return None
+        # Forced move: nothing to search
+        if root is None:
+            root = MCTSNode({legal_moves[0]: 1.0})
+        self.latest_depth, self.latest_heatmap = 0, {}
+        self.latest_stats = {"simulations": 0, "stop_reason": "single_move"}
+        self.latest_profile = None
+        return legal_moves[0], {legal_moves[0]: 1.0}, root
+
+    def _new_root(self, priors, value):
+        self.tt.clear() # Fresh tree, nothing to share with
+        return MCTSNode(priors, value)
+
+    def _reroot(self, root):
+        """
+        Adopts `root` (a fresh node or a subtree kept from an earlier search)
+        as the tree the pool accounts for: low-visit branches are pruned and
+        the transposition table forgets nodes that are no longer reachable,
+        so the rest of the old tree can be garbage collected. A kept tree
+        using over half the memory cap is pruned harder until it fits, or
+        until only proven subtrees, which are never pruned, are left.
+        """
+        self.pool.max_bytes = int(self.params['TREE_MEMORY_MB'] * 1024 * 1024)
+        min_visits = self.params['PRUNE_MIN_VISITS']
+        live = self.pool.reroot(root, min_visits)
+        while self.pool.bytes_used > self.pool.max_bytes // 2 and root.children and min_visits <= root.total_n:
+            min_visits = max(2 * min_visits, 2)
+            live = self.pool.reroot(root, min_visits)
+        if self.tt:
+            self.tt = OrderedDict((k, n) for k, n in self.tt.items() if id(n) in live)
+
+    def _begin_search(self, board, is_training, root, max_time, max_nodes, stop_event):
+        if root is not self.pool.root or self.pool.full():
+            self._reroot(root)
+        self.tt_stats = {"lookups": 0, "hits": 0}
+        if self.params['TRANSPOSITIONS']:
+            self._tt_store(chess.polyglot.zobrist_hash(board), root)
         
         # Dirichlet Noise (Critical for diversity)
         if is_training and len(root.P) > 0:
             # High Alpha (0.8) creates a flatter distribution, forcing variety
             noise = np.random.dirichlet([self.params['ALPHA']] * len(root.P))
-            for i, move in enumerate(root.P):
-                root.P[move] = (1 - self.params['EPS']) * root.P[move] + self.params['EPS'] * noise[i]
+            root.P = ((1 - self.params['EPS']) * root.P + self.params['EPS'] * noise).astype(np.float32)
         
         self.square_visits = Counter() 
         self.max_depth_reached = 0
-        sim_count = int(self.params['SIMULATIONS'])
-        num_threads = self.params['PARALLEL_THREADS']
-        root_fen = board.fen()
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = [executor.submit(self._run_simulation, root_fen, root) for _ in range(sim_count)]
-            concurrent.futures.wait(futures)
+        # Budget shared by every simulation of this search
+        if max_nodes is None and max_time is None:
+            max_nodes = int(self.params['SIMULATIONS'])
+        self._start_time = time.time()
+        self._budget = max_nodes
+        self._deadline = self._start_time + max_time if max_time is not None else None
+        self._sims_started = self._sims_done = 0
+        self._stop_reason = None
+        self._stop_event = stop_event
+        self._last_pi = None
+        self._next_convergence_check = self.params['CONVERGENCE_CHECK']
+        self._proven = 0 # Nodes solved during this search
+
+        self.profile = SearchProfile() if self.params['PROFILE'] else None
+        self._cache_hits_before = self._evaluator_cache_hits()
 
+    def _evaluator_cache_hits(self):
+        # Read off the evaluator's cache, so it includes hits of any other
+        # search sharing the evaluator at the same time
+        cache = getattr(self.evaluator, 'cache', None)
+        return getattr(cache, 'hits', 0)
+
+    def _finish_search(self, root, batches, evaluated):
+        elapsed = time.time() - self._start_time
+        sim_count = self._sims_done
+
+        self.latest_stats = {
+            "simulations": sim_count,
+            "budget": self._budget,
+            "stop_reason": self._stop_reason,
+            "sims_per_sec": round(sim_count / elapsed, 1) if elapsed > 0 else 0.0,
+            "avg_batch_size": round(evaluated / batches, 2) if batches else 0.0,
+            "proven_nodes": self._proven,
+            "root_proven": root.proven,
+            **self.pool.stats(),
+        }
+        if self.params['TRANSPOSITIONS']:
+            lookups, hits = self.tt_stats["lookups"], self.tt_stats["hits"]
+            self.latest_stats.update({
+                "tt_hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "nodes_saved": hits, # Expansions (and evaluations) served by an existing node
+                "tt_size": len(self.tt),
+            })
         self.latest_depth = self.max_depth_reached
+
+        prof = self.profile
+        if prof is not None:
+            prof.searches = 1
+            prof.simulations = sim_count
+            prof.wall = elapsed
+            prof.tt_hits = self.tt_stats["hits"]
+            prof.cache_hits = self._evaluator_cache_hits() - self._cache_hits_before
+            if self.params['SEARCH_MODE'] == 'async':
+                # One thread: whatever the coroutines were not doing themselves
+                # was spent inside the evaluator (or other searches on the loop)
+                prof.eval = max(0.0, elapsed - sum(getattr(prof, p) for p in ("select", "board", "terminal", "expand", "backup")))
+        self.latest_profile = prof
         self.latest_heatmap = {
-            chess.SQUARE_NAMES[s]: round(v / sim_count, 3) 
+            chess.SQUARE_NAMES[s]: round(v / max(sim_count, 1), 3) 
             for s, v in self.square_visits.items()
         }
 
-        total_n = sum(root.N.values())
+        counts = self._solved_counts(root)
+        total_n = float(counts.sum()) # Python floats: np.random.choice checks the sum in float64
         if total_n == 0:
-            return list(root.P.keys())[0], {m: 1/len(root.P) for m in root.P}, root
+            return root.move(0), {root.move(i): 1/len(root.P) for i in range(len(root.P))}, root
             
-        pi_dist = {m: n / total_n for m, n in root.N.items()}
-        best_move = max(root.N, key=root.N.get)
+        pi_dist = {root.move(i): float(n) / total_n for i, n in enumerate(counts)}
+        best_move = root.move(int(np.argmax(counts)))
         
         return best_move, pi_dist, root
 
-    def _run_simulation(self, fen, root):
+    def _solved_counts(self, root):
+        """Root visit counts with proven results applied: only winning moves if there are any, never lost ones."""
+        counts = root.N.copy()
+        if root.proven == 1.0:
+            wins = np.array([self._move_result(root, i) == 1.0 for i in range(len(counts))])
+            return np.where(wins, np.maximum(counts, 1), 0)
+        if root.lost is not None and not root.lost.all():
+            counts[root.lost] = 0
+        return counts
+
+    def _simulation_worker(self, board, root):
+        board = board.copy() # Each worker walks its own board with push/pop
+        # Workers profile privately and merge when they finish
+        prof = SearchProfile() if self.profile is not None else None
+        lock = prof.timed_lock(self.tree_lock) if prof else self.tree_lock
+        while True:
+            with lock:
+                if self._should_stop(root):
+                    if prof:
+                        self.profile.add(prof)
+                    return
+                self._sims_started += 1
+            self._run_simulation(board, root, prof, lock)
+
+    def _should_stop(self, root):
+        """Checks the node/time budget and early-termination rules. Call under tree_lock."""
+        if self._stop_reason is not None:
+            return True
+        if self._stop_event is not None and self._stop_event.is_set():
+            self._stop_reason = "stopped"
+            return True
+        started = self._sims_started
+        now = time.time()
+        if self._budget is not None and started >= self._budget:
+            self._stop_reason = "budget"
+        elif self._deadline is not None and now >= self._deadline:
+            self._stop_reason = "time"
+        elif root.proven is not None:
+            self._stop_reason = "proven"
+        elif self.pool.full():
+            self._stop_reason = "memory"
+        elif self.params['EARLY_STOP'] and self._is_decided(root, now):
+            self._stop_reason = "decided"
+        elif self.params['CONVERGENCE_EPS'] > 0 and self._has_converged(root):
+            self._stop_reason = "converged"
+        return self._stop_reason is not None
+
+    def _is_decided(self, root, now):
+        """True once the most visited root move cannot be caught in the remaining budget."""
+        if len(root.N) < 2 or self._sims_done == 0:
+            return False
+        remaining = float('inf')
+        if self._budget is not None:
+            remaining = self._budget - self._sims_started
+        if self._deadline is not None:
+            rate = self._sims_done / max(now - self._start_time, 1e-6)
+            remaining = min(remaining, rate * (self._deadline - now))
+        # Root counts still carry virtual loss from simulations in flight
+        in_flight = (self._sims_started - self._sims_done) * self.v_loss
+        counts = root.N if root.lost is None else np.where(root.lost, 0, root.N)
+        second, best = np.partition(counts, -2)[-2:]
+        return best - second > remaining + in_flight
+
+    def _has_converged(self, root):
+        done = self._sims_done
+        if done < self._next_convergence_check or root.total_n <= 0:
+            return False
+        self._next_convergence_check = done + self.params['CONVERGENCE_CHECK']
+        pi = root.N / root.total_n
+        last, self._last_pi = self._last_pi, pi
+        return last is not None and float(np.abs(pi - last).sum()) < self.params['CONVERGENCE_EPS']
+
+    def _run_simulation(self, board, root, prof=None, lock=None):
+        lock = lock or self.tree_lock
+        # SELECTION (Using Virtual Loss for Parallelism)
+        with lock:
+            if prof: t = prof.clock()
+            path, value = self._descend(board, root)
+            if prof: t = prof.lap("select", t)
+        node, slot = path[-1]
+
+        # EXPANSION & EVALUATION
+        if value is None:
+            value = self._score_terminal(board, node, slot)
+        key = None
+
+        if value is None and self.params['TRANSPOSITIONS']:
+            key = chess.polyglot.zobrist_hash(board)
+            with lock:
+                value = self._link_transposition(path, key)
+        if prof: t = prof.lap("terminal", t)
+
+        if value is None:
+            p_priors, value = self.evaluator.evaluate(board)
+            if prof:
+                prof.evals += 1
+                t = prof.lap("eval", t)
+            with lock:
+                if prof: t = prof.clock()
+                self._expand(node, slot, key, p_priors, value)
+                if prof: t = prof.lap("expand", t)
+
+        # BACKPROPAGATION
+        with lock:
+            if prof: t = prof.clock()
+            self._backup(path, value)
+            self._sims_done += 1
+            if prof: t = prof.lap("backup", t)
+        for _ in path:
+            board.pop()
+        if prof: prof.lap("board", t)
+
+    def _search_batched(self, board, root):
+        """
+        Leaf-parallel search on the calling thread: gather up to BATCH_SIZE
+        leaves under virtual loss, evaluate them in one evaluator call, then
+        expand and back them all up. Returns (batches, leaves evaluated).
+        """
+        batch_size = max(1, int(self.params['BATCH_SIZE']))
+        batches = evaluated = 0
+
+        while not self._should_stop(root):
+            k = batch_size
+            if self._budget is not None:
+                k = min(k, self._budget - self._sims_done)
+            pending, finished = self._gather_leaves(board, root, k)
+            if pending:
+                prof = self.profile
+                if prof: t = prof.clock()
+                results = self.evaluator.evaluate_batch([b for _, b, _ in pending])
+                if prof:
+                    prof.evals += len(pending)
+                    prof.lap("eval", t)
+                self._resolve_leaves(pending, results)
+                batches += 1
+                evaluated += len(pending)
+            self._sims_done += len(pending) + finished
+            self._sims_started = self._sims_done
+
+        return batches, evaluated
+
+    async def _search_async(self, board, root):
+        """
+        Runs ASYNC_INFLIGHT simulation coroutines on one event loop. Each
+        awaits evaluator.evaluate_async() at its leaf, so the evaluator sees
+        every waiting leaf as one batch, with no threads or polling on the
+        search side. Returns (batches, leaves evaluated), cache hits not included.
+        """
+        # AlphaZeroEvaluator counts its flushes; without counters every call is its own batch
+        counted = hasattr(self.evaluator, 'async_batches') and hasattr(self.evaluator, 'async_evals')
+        if counted:
+            batches_before, evals_before = self.evaluator.async_batches, self.evaluator.async_evals
+        self._async_evaluated = 0
+        workers = max(1, int(self.params['ASYNC_INFLIGHT']))
+        if self._budget is not None:
+            workers = min(workers, self._budget)
+
+        await asyncio.gather(*(self._simulation_coroutine(board.copy(), root) for _ in range(workers)))
+
+        if counted:
+            return self.evaluator.async_batches - batches_before, self.evaluator.async_evals - evals_before
+        return self._async_evaluated, self._async_evaluated
+
+    async def _simulation_coroutine(self, board, root):
+        # Single-threaded: the tree is only touched between awaits, so no lock
+        prof = self.profile # Eval time is filled in by _finish_search
+        while not self._should_stop(root):
+            self._sims_started += 1
+            if prof: t = prof.clock()
+            path, value = self._descend(board, root)
+            if prof: t = prof.lap("select", t)
+            node, slot = path[-1]
+
+            if value is None:
+                value = self._score_terminal(board, node, slot)
+            key = None
+            if value is None and self.params['TRANSPOSITIONS']:
+                key = chess.polyglot.zobrist_hash(board)
+                value = self._link_transposition(path, key)
+            if prof: prof.lap("terminal", t)
+
+            if value is None:
+                p_priors, value = await self.evaluator.evaluate_async(board)
+                self._async_evaluated += 1
+                if prof:
+                    prof.evals += 1
+                    t = prof.clock()
+                self._expand(node, slot, key, p_priors, value)
+                if prof: prof.lap("expand", t)
+
+            if prof: t = prof.clock()
+            self._backup(path, value)
+            self._sims_done += 1
+            if prof: t = prof.lap("backup", t)
+            for _ in path:
+                board.pop()
+            if prof: prof.lap("board", t)
+
+    def _gather_leaves(self, board, root, k):
+        """
+        Descends up to k times from `board` (restored after each descent).
+        Terminal leaves are backed up immediately; the rest are returned as
+        [(path, leaf_board, tt_key), ...] awaiting evaluation. Stops early if
+        a descent collides with a leaf that is already pending.
+        """
+        pending = []
+        in_flight = set()
+        finished = 0
+        prof = self.profile
+
+        for _ in range(k):
+            if prof: t = prof.clock()
+            path, value = self._descend(board, root)
+            if prof: t = prof.lap("select", t)
+            node, slot = path[-1]
+
+            if value is None:
+                value = self._score_terminal(board, node, slot)
+            key = None
+            if value is None and self.params['TRANSPOSITIONS']:
+                key = chess.polyglot.zobrist_hash(board)
+                value = self._link_transposition(path, key)
+            if prof: t = prof.lap("terminal", t)
+
+            if value is not None:
+                self._backup(path, value)
+                finished += 1
+                if prof: t = prof.lap("backup", t)
+            elif (id(node), slot) in in_flight:
+                # Virtual loss could not steer us elsewhere; evaluate what we have
+                self._revert_virtual_loss(path)
+                for _ in path:
+                    board.pop()
+                if prof: prof.lap("board", t)
+                break
+            else:
+                in_flight.add((id(node), slot))
+                pending.append((path, board.copy(stack=LEAF_HISTORY), key))
+
+            for _ in path:
+                board.pop()
+            if prof: prof.lap("board", t)
+
+        return pending, finished
+
+    def _resolve_leaves(self, pending, results):
+        prof = self.profile
+        for (path, _, key), (p_priors, value) in zip(pending, results):
+            node, slot = path[-1]
+            if prof: t = prof.clock()
+            self._expand(node, slot, key, p_priors, value)
+            if prof: t = prof.lap("expand", t)
+            self._backup(path, value)
+            if prof: prof.lap("backup", t)
+
+    def _expand(self, node, slot, key, p_priors, value):
+        """Attaches the evaluated child, reusing a node another path stored meanwhile."""
+        if slot in node.children:
+            return
+        child = self.tt.get(key) if key is not None else None
+        if child is None:
+            child = self.pool.new_node(p_priors, value)
+            if key is not None:
+                self._tt_store(key, child)
+        node.children[slot] = child
+
+    def _link_transposition(self, path, key):
+        """
+        If the leaf position is already in the tree via another move order,
+        links the edge to that node and returns its value for backup (saving
+        an evaluation). Returns None on a miss.
+        """
+        self.tt_stats["lookups"] += 1
+        shared = self.tt.get(key)
+        if shared is None:
+            return None
+        self.tt.move_to_end(key)
+        if any(shared is n for n, _ in path):
+            return 0.0 # Leads back to a position on this line: repetition, score as a draw
+        node, slot = path[-1]
+        if slot not in node.children:
+            node.children[slot] = shared
+        self.tt_stats["hits"] += 1
+        # Edge statistics live on the parent, so each parent keeps its own
+        # N/W for the edge while the subtree below is shared. Backing up the
+        # shared node's mean (rather than its raw evaluation) lets a fresh
+        # edge inherit everything already learned about the position.
+        return shared.mean_value()
+
+    def _tt_store(self, key, node):
+        self.tt[key] = node
+        self.tt.move_to_end(key)
+        while len(self.tt) > self.params['TT_SIZE']:
+            self.tt.popitem(last=False) # Evict least recently used; the node stays in the tree
+
+    def _descend(self, board, root):
+        """
+        Walks from the root to a leaf, pushing each move onto `board` and
+        applying virtual loss along the path. Returns (path, value): value is
+        known for proven (incl. terminal) nodes and repetition cycles, and
+        None when the leaf still has to be scored. The caller pops the moves
+        afterwards.
+        """
         node = root
         path = []
-        temp_board = chess.BaseBoard(fen)
-        current_turn = 'w' in fen.split()[1] 
         depth = 0
+        value = None
 
-        # SELECTION (Using Virtual Loss for Parallelism)
-        with self.tree_lock:
-            while True:
-                move = self._select_child(node)
-                path.append((node, move))
-                self.square_visits[move.to_square] += 1
-                
-                node.N[move] += self.v_loss
-                node.W[move] -= self.v_loss
-                
-                temp_board.push(move)
-                current_turn = not current_turn
-                depth += 1
-                
-                if move not in node.children:
-                    break
-                node = node.children[move]
+        while True:
+            slot = self._select_child(node)
+            path.append((node, slot))
+            move = node.move(slot)
+            self.square_visits[move.to_square] += 1
+            
+            node.N[slot] += self.v_loss
+            node.W[slot] -= self.v_loss
+            node.total_n += self.v_loss
+            node.total_w -= self.v_loss
+            
+            board.push(move)
+            depth += 1
+            
+            child = node.children.get(slot)
+            if child is None:
+                break
+            if child.proven is not None:
+                value = child.proven # Solved: nothing left to search below
+                break
+            if self.params['TRANSPOSITIONS'] and any(child is n for n, _ in path):
+                value = 0.0 # Cycle through a shared transposition node: repetition
+                break
+            node = child
 
         if depth > self.max_depth_reached:
             self.max_depth_reached = depth
+        return path, value
 
-        # EXPANSION & EVALUATION
-        full_board_eval = chess.Board(temp_board.fen())
-        full_board_eval.turn = current_turn
-
-        if not full_board_eval.is_game_over():
-            p_priors, value = self.evaluator.evaluate(full_board_eval)
-            with self.tree_lock:
-                if move not in node.children:
-                    node.children[move] = MCTSNode(p_priors)
+    def _score_terminal(self, board, node, slot):
+        """
+        None if the game continues at the leaf, else its result relative to
+        the side to move. Endings that depend only on the position are cached
+        as a terminal child so later visits skip the check; repetition draws
+        depend on the path and are re-checked every time.
+        """
+        if board.is_repetition(3):
+            return 0.0
+        outcome = board.outcome()
+        if outcome is None:
+            return None
+        # AlphaZero perspective: value is relative to the side to move
+        if outcome.winner is None:
+            value = 0.0
         else:
-            res = full_board_eval.result()
-            # AlphaZero perspective: value is relative to current_turn
-            if res == "1-0":
-                val = 1.0 if current_turn else -1.0
-            elif res == "0-1":
-                val = -1.0 if current_turn else 1.0
-            else:
-                val = 0.0
-            value = val
+            value = 1.0 if outcome.winner == board.turn else -1.0
+        if outcome.termination in _POSITIONAL_ENDINGS:
+            with self.tree_lock:
+                if slot not in node.children:
+                    node.children[slot] = self.pool.new_node({}, value, terminal=True)
+        return value
 
-        # BACKPROPAGATION
-        with self.tree_lock:
-            for n, m in reversed(path):
-                n.N[m] = n.N[m] - self.v_loss + 1
-                n.W[m] = n.W[m] + self.v_loss + value
-                n.Q[m] = n.W[m] / n.N[m]
-                value = -value
+    def _backup(self, path, value):
+        """`value` is for the side to move at the leaf; each edge is credited from its mover's side."""
+        for n, s in reversed(path):
+            value = -value
+            n.N[s] += 1 - self.v_loss
+            n.W[s] += self.v_loss + value
+            n.total_n += 1 - self.v_loss
+            n.total_w += self.v_loss + value
+        self._prove(path)
+
+    def _prove(self, path):
+        """
+        MCTS-solver step after a backup: if the leaf of `path` is proven,
+        settle as many of its ancestors as possible. A node is won as soon as
+        one move leads to a lost position, and lost (or drawn) once every
+        move is proven and none wins. Moves proven lost are masked so
+        selection skips them.
+        """
+        for node, slot in reversed(path):
+            child = node.children.get(slot)
+            if child is None or child.proven is None or node.proven is not None:
+                return
+            result = self._move_result(node, slot)
+            if result == -1.0:
+                if node.lost is None:
+                    node.lost = np.zeros(len(node.moves), dtype=bool)
+                elif node.lost[slot]:
+                    return # Already known, and so is everything above
+                node.lost[slot] = True
+            if result != 1.0:
+                if len(node.children) < len(node.moves):
+                    return
+                results = [self._move_result(node, i) for i in range(len(node.moves))]
+                if any(r is None for r in results):
+                    return
+                result = max(results)
+            node.proven = result
+            self._proven += 1
+
+    def _move_result(self, node, slot):
+        """Exact result of playing `slot` for the side to move at node, or None if unproven."""
+        child = node.children.get(slot)
+        if child is None or child.proven is None:
+            return None
+        return -child.proven
+
+    def _revert_virtual_loss(self, path):
+        for n, s in path:
+            n.N[s] -= self.v_loss
+            n.W[s] += self.v_loss
+            n.total_n -= self.v_loss
+            n.total_w += self.v_loss
 
     def _select_child(self, node):
-        total_n = sum(node.N.values())
+        """Vectorized PUCT with first-play urgency; returns the winning move slot."""
+        total_n = node.total_n
         total_n_sqrt = math.sqrt(total_n + 1)
         
         if total_n > 0:
-            parent_q = -sum(node.W.values()) / total_n
+            parent_q = node.total_w / total_n
             fpu_val = parent_q - self.params['FPU_REDUCTION']
         else:
             fpu_val = 0.0
 
-        best_score = -float('inf')
-        best_move = None
-
-        for move, p_val in node.P.items():
-            n_v = node.N[move]
-            q_val = node.W[move] / n_v if n_v > 0 else fpu_val
-            # Upper Confidence Bound applied to Trees
-            u = self.c_puct * p_val * total_n_sqrt / (1 + n_v)
-            score = q_val + u
-            
-            if score > best_score:
-                best_score, best_move = score, move
-        return best_move
\ No newline at end of file
+        n_v = node.N
+        score = node.W / np.maximum(n_v, 1)
+        score[n_v == 0] = fpu_val
+        # Upper Confidence Bound applied to Trees
+        score += (self.c_puct * total_n_sqrt) * node.P / (1 + n_v)
+        if node.lost is not None:
+            score[node.lost] = -np.inf # Proven losing moves are never worth a visit
+        return int(score.argmax())
\ No newline at end of file
@@ -11,6 +11,8 @@ stats = {
     "v_loss": [],
     "lr": [],
     "buffer_size": 0,
+    "buffer_fill": 0.0,
+    "ingest_rate": 0.0,
     "last_update": time.time()
 }
 
@@ -26,6 +28,8 @@ def update():
     stats["v_loss"].append(data.get("v_loss"))
     stats["lr"].append(data.get("lr"))
     stats["buffer_size"] = data.get("buffer_size")
+    stats["buffer_fill"] = data.get("buffer_fill", 0.0)
+    stats["ingest_rate"] = data.get("ingest_rate", 0.0)
     stats["last_update"] = time.time()
     return jsonify({"status": "ok"})
 
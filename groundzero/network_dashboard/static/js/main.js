@@ -5,7 +5,8 @@ async function refresh() {
         if (data.iterations.length === 0) return;
 
         // Text Updates
-        document.getElementById('buffer-val').innerText = data.buffer_size;
+        document.getElementById('buffer-val').innerText =
+            `${data.buffer_size} (${(data.buffer_fill * 100).toFixed(1)}% full, ${data.ingest_rate.toFixed(0)}/s ingest)`;
         document.getElementById('lr-val').innerText = data.lr[data.lr.length - 1].toFixed(6);
         document.getElementById('iter-count').innerText = data.iterations.length;
         
@@ -18,11 +18,14 @@ def status():
     files = glob.glob(os.path.join(BUFFER_PATH, "*.npz"))
     
     # Convert the Manager Dict to a standard dict for JSON serialization
-    workers_data = {str(k): v for k, v in shared_state.items()}
+    state = dict(shared_state)
+    inference = state.pop("inference", None) # Published by the inference server, not a worker
+    workers_data = {str(k): v for k, v in state.items()}
     
     return jsonify({
         "buffer_count": len(files),
-        "workers": workers_data
+        "workers": workers_data,
+        "inference": inference
     })
 
 def run_dashboard_server(stats_dict):
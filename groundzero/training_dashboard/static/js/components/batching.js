@@ -0,0 +1,35 @@
+export class BatchingChart {
+    constructor(id) {
+        const ctx = document.getElementById(id).getContext('2d');
+        this.chart = new Chart(ctx, {
+            type: 'bar',
+            data: {
+                labels: [],
+                datasets: [{
+                    label: 'Batches',
+                    data: [],
+                    backgroundColor: 'rgba(255, 70, 0, 0.6)',
+                    borderWidth: 0
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                animation: false,
+                scales: {
+                    x: { grid: { display: false }, ticks: { font: { size: 9 } } },
+                    y: { beginAtZero: true, grid: { color: '#f9f9f9' }, ticks: { font: { size: 9 } } }
+                },
+                plugins: { legend: { display: false } }
+            }
+        });
+    }
+
+    // stats: the inference server's AdaptiveBatcher.stats()
+    update(stats) {
+        if (!stats || !stats.batch_histogram) return;
+        this.chart.data.labels = Object.keys(stats.batch_histogram);
+        this.chart.data.datasets[0].data = Object.values(stats.batch_histogram);
+        this.chart.update();
+    }
+}
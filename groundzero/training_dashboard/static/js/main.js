@@ -7,6 +7,7 @@ import { PhaseChart } from './components/phase.js';
 import { LatencyChart } from './components/latency.js';
 import { EntropyChart } from './components/entropy.js';
 import { GameGallery } from './components/game_gallery.js';
+import { BatchingChart } from './components/batching.js';
 
 // Global UI State
 let activeWorkerId = "0";
@@ -46,7 +47,8 @@ const components = {
     depthChart: new DepthChart('depthChart'),
     phaseChart: new PhaseChart('phaseChart'),
     latencyChart: new LatencyChart('latencyChart'),
-    entropyChart: new EntropyChart('entropyChart')
+    entropyChart: new EntropyChart('entropyChart'),
+    batchChart: new BatchingChart('batchChart')
 };
 
 const updateHistoryView = () => {
@@ -85,6 +87,22 @@ async function sync() {
     
     components.workers.render(data.workers, activeWorkerId);
 
+    // Inference server batching (shared by all workers)
+    const inf = data.inference;
+    if (inf) {
+        const summary = document.getElementById('inference-summary');
+        if (summary) {
+            summary.innerText = `${inf.evals_per_sec}/s | p50 ${inf.latency_p50_ms} p95 ${inf.latency_p95_ms} p99 ${inf.latency_p99_ms} ms` +
+                ` | queue ${inf.queue_depth} | batch ${inf.mean_batch} (max ${inf.batch_limit}, wait ${inf.max_delay_ms} ms)`;
+            // Server-side result cache, for the model version being served
+            const cache = inf.cache && inf.cache.per_version[inf.cache.version];
+            if (cache) {
+                summary.innerText += ` | v${inf.cache.version} dedup ${(cache.dedup_rate * 100).toFixed(1)}% hit ${(cache.hit_rate * 100).toFixed(1)}%`;
+            }
+        }
+        components.batchChart.update(inf);
+    }
+
     const activeStats = data.workers[activeWorkerId];
     if (activeStats) {
         // 1. Gallery Update